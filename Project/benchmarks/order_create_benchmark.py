@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Order creation benchmark against a fake user-service
+
+Starts the fake user-service from order-service's test suite on localhost,
+runs order-service with uvicorn pointed at it, and drives concurrent
+POST /api/v1/orders requests. Latency, error rate and throughput limits of
+the fake are configurable, so changes to the order -> user path can be
+measured on one machine.
+
+Usage:
+    python benchmarks/order_create_benchmark.py --requests 2000 --concurrency 50 \
+        --latency 0.005 --users 100
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import httpx
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ORDER_SERVICE_DIR = os.path.join(PROJECT_ROOT, "microservices", "order-service")
+
+sys.path.insert(0, os.path.join(ORDER_SERVICE_DIR, "tests"))
+from fake_user_service import FakeUserService, running_fake_user_service  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def wait_until_healthy(base_url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.05)
+    raise TimeoutError(f"{base_url} did not become healthy within {timeout}s")
+
+
+async def drive(base_url: str, user_ids, total: int, concurrency: int, items: int) -> dict:
+    latencies = []
+    statuses = {}
+    next_request = iter(range(total))
+
+    async def worker(client: httpx.AsyncClient):
+        for i in next_request:
+            payload = {
+                "user_id": user_ids[i % len(user_ids)],
+                "items": [
+                    {"product_id": f"prod-{n}", "product_name": f"Product {n}", "quantity": 1, "price": 9.99}
+                    for n in range(items)
+                ],
+                "shipping_address": "1 Benchmark Way"
+            }
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/orders", json=payload)
+                key = str(response.status_code)
+            except httpx.HTTPError as e:
+                key = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "duration_seconds": round(elapsed, 4),
+        "throughput_rps": round(total / elapsed, 2),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "statuses": statuses,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark order creation against a fake user-service")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=100, help="Distinct users orders are spread over")
+    parser.add_argument("--items", type=int, default=3, help="Items per order")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake user-service latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra random latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of fake 500 responses")
+    parser.add_argument("--max-rps", type=float, default=None, help="Fake user-service rate limit")
+    parser.add_argument("--max-concurrency", type=int, default=None, help="Fake user-service concurrency limit")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra order-service setting, e.g. USER_CACHE_TTL_SECONDS=30 (repeatable)")
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "benchmarks", "results", "order_create.jsonl"))
+    args = parser.parse_args()
+
+    fake = FakeUserService(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        max_rps=args.max_rps,
+        max_concurrency=args.max_concurrency,
+        seed=0
+    )
+    user_ids = [fake.add_user(name=f"Bench {i}")["id"] for i in range(args.users)]
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    with running_fake_user_service(fake) as service:
+        port = free_port()
+        env = dict(os.environ, USER_SERVICE_URL=service.url, LOG_LEVEL="WARNING", **extra_env)
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(port), "--log-level", "warning", "--no-access-log"],
+            cwd=ORDER_SERVICE_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            asyncio.run(wait_until_healthy(base_url))
+            stats = asyncio.run(drive(base_url, user_ids, args.requests, args.concurrency, args.items))
+        finally:
+            process.terminate()
+            process.wait()
+
+    result = {
+        "benchmark": "order_create",
+        "revision": git_revision(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "users": args.users,
+        "items": args.items,
+        "fake_user_service": {
+            "latency": args.latency,
+            "jitter": args.jitter,
+            "error_rate": args.error_rate,
+            "max_rps": args.max_rps,
+            "max_concurrency": args.max_concurrency,
+            "requests_served": dict(fake.requests),
+        },
+        "settings": extra_env,
+        **stats,
+    }
+    print(json.dumps(result))
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "a") as output:
+        output.write(json.dumps(result) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark - time-to-first-healthy-response and image size per service
+
+Usage:
+    # Run each service from source with uvicorn
+    python benchmarks/startup_benchmark.py --mode local
+
+    # Run each service from its Docker image (optionally building it first)
+    python benchmarks/startup_benchmark.py --mode docker --build
+
+Each run appends one JSON line per service to the output file so results can
+be tracked over time.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICES = {
+    "user-service": {"path": "microservices/user-service", "port": 8000},
+    "order-service": {"path": "microservices/order-service", "port": 8001},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_healthy(url: str, timeout: float) -> float:
+    """Poll url until it returns 200; returns seconds waited"""
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f"{url} did not become healthy within {timeout}s")
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_local(name: str, service: dict, timeout: float) -> dict:
+    port = free_port()
+    env = dict(os.environ, DOCS_ENABLED="false")
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning"],
+        cwd=os.path.join(PROJECT_ROOT, service["path"]),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_healthy(f"http://127.0.0.1:{port}/health", timeout)
+        return {"time_to_healthy_seconds": round(time.perf_counter() - started, 4)}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def image_size(image: str) -> int:
+    output = subprocess.check_output(
+        ["docker", "image", "inspect", "--format", "{{.Size}}", image], text=True
+    )
+    return int(output.strip())
+
+
+def run_docker(name: str, service: dict, timeout: float, build: bool, tag: str) -> dict:
+    image = f"{name}:{tag}"
+    if build:
+        subprocess.check_call(
+            ["docker", "build", "-q", "-t", image, os.path.join(PROJECT_ROOT, service["path"])],
+            stdout=subprocess.DEVNULL,
+        )
+    port = free_port()
+    started = time.perf_counter()
+    container = subprocess.check_output(
+        ["docker", "run", "-d", "--rm", "-e", "DOCS_ENABLED=false",
+         "-p", f"127.0.0.1:{port}:{service['port']}", image],
+        text=True,
+    ).strip()
+    try:
+        wait_until_healthy(f"http://127.0.0.1:{port}/health", timeout)
+        elapsed = time.perf_counter() - started
+    finally:
+        subprocess.call(["docker", "stop", "-t", "1", container], stdout=subprocess.DEVNULL)
+    return {
+        "time_to_healthy_seconds": round(elapsed, 4),
+        "image": image,
+        "image_size_bytes": image_size(image),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Measure service cold start")
+    parser.add_argument("--mode", choices=["local", "docker"], default="local")
+    parser.add_argument("--service", choices=sorted(SERVICES), action="append",
+                        help="Service to measure (repeatable, default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="Starts per service; the median is reported")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--build", action="store_true", help="Build the Docker image before measuring")
+    parser.add_argument("--tag", default="latest", help="Docker image tag to run")
+    parser.add_argument("--output", default=os.path.join(PROJECT_ROOT, "benchmarks", "results", "startup.jsonl"))
+    args = parser.parse_args()
+
+    revision = git_revision()
+    results = []
+    for name in args.service or sorted(SERVICES):
+        service = SERVICES[name]
+        runs = []
+        for i in range(args.runs):
+            if args.mode == "docker":
+                runs.append(run_docker(name, service, args.timeout, args.build and i == 0, args.tag))
+            else:
+                runs.append(run_local(name, service, args.timeout))
+        timings = sorted(run["time_to_healthy_seconds"] for run in runs)
+        result = {
+            "benchmark": "startup",
+            "service": name,
+            "mode": args.mode,
+            "revision": revision,
+            "timestamp": datetime.utcnow().isoformat(),
+            "runs": args.runs,
+            "time_to_healthy_seconds": timings[len(timings) // 2],
+            "time_to_healthy_min_seconds": timings[0],
+            "time_to_healthy_max_seconds": timings[-1],
+        }
+        if "image_size_bytes" in runs[0]:
+            result["image"] = runs[0]["image"]
+            result["image_size_bytes"] = runs[0]["image_size_bytes"]
+        print(json.dumps(result))
+        results.append(result)
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "a") as output:
+        for result in results:
+            output.write(json.dumps(result) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,270 @@
+"""
+Cold, compressed, append-only archive for old orders
+
+Orders are appended in batches as zlib-compressed JSON segments, each framed
+by a magic number, payload length and CRC32, either to ARCHIVE_PATH or to an
+in-memory buffer. Only
+the order_id -> segment offset and user_id -> order IDs indexes stay in memory;
+reads decompress the segment (with a small LRU of decoded segments), and pages
+are sliced from the ID indexes so skipped orders are never decoded.
+Archived records are the expanded response shape and are read-only.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import fcntl
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from app.offload import run_offloaded
+
+logger = logging.getLogger(__name__)
+
+# Frame header: magic, payload length, CRC32 of the payload
+FRAME_HEADER = struct.Struct(">4sII")
+FRAME_MAGIC = b"OARC"
+
+
+class _MemoryLog:
+    def __init__(self):
+        self._data = bytearray()
+
+    def lock(self):
+        pass
+
+    def unlock(self):
+        pass
+
+    def append(self, data: bytes) -> int:
+        offset = len(self._data)
+        self._data += data
+        return offset
+
+    def read(self, offset: int, length: int) -> bytes:
+        return bytes(self._data[offset:offset + length])
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class _FileLog:
+    """Append-only file; several worker processes may share one path.
+
+    Appends and startup loading hold an exclusive flock, so a loader never
+    sees another process's half-written frame, and each append's offset is
+    read back from its own file position after the O_APPEND write.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def lock(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+
+    def unlock(self):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def append(self, data: bytes) -> int:
+        self.lock()
+        try:
+            written = os.write(self._fd, data)
+            end = os.lseek(self._fd, 0, os.SEEK_CUR)
+        finally:
+            self.unlock()
+        if written != len(data):
+            raise OSError(f"Short archive write: {written} of {len(data)} bytes")
+        return end - len(data)
+
+    def read(self, offset: int, length: int) -> bytes:
+        return os.pread(self._fd, length, offset)
+
+    def size(self) -> int:
+        return os.fstat(self._fd).st_size
+
+    def truncate(self, size: int):
+        os.ftruncate(self._fd, size)
+
+    def close(self):
+        os.close(self._fd)
+
+
+def _encode_segment(orders: List[dict], level: int) -> bytes:
+    payload = zlib.compress("\n".join(json.dumps(order) for order in orders).encode(), level)
+    return FRAME_HEADER.pack(FRAME_MAGIC, len(payload), zlib.crc32(payload)) + payload
+
+
+def _decode_segment(frame: bytes) -> Dict[str, dict]:
+    _, length, _ = FRAME_HEADER.unpack_from(frame)
+    payload = zlib.decompress(frame[FRAME_HEADER.size:FRAME_HEADER.size + length])
+    orders = (json.loads(line) for line in payload.decode().split("\n"))
+    return {order["id"]: order for order in orders}
+
+
+class OrderArchive:
+    """Append-only archive of orders, queryable by order ID and user ID"""
+
+    def __init__(self, path: Optional[str] = None, cache_segments: int = 8, level: int = 6):
+        self.path = path
+        self.level = level
+        self.cache_segments = cache_segments
+        self._log = _FileLog(path) if path else _MemoryLog()
+        self._write_lock = threading.Lock()
+        self._cache_lock = threading.Lock()
+        self._ids: List[str] = []
+        self._locations: Dict[str, Tuple[int, int]] = {}
+        self._by_user: Dict[str, List[str]] = {}
+        self._pending: Dict[str, dict] = {}
+        self._cache: "OrderedDict[int, Dict[str, dict]]" = OrderedDict()
+        self.segments = 0
+
+    def load(self, on_order: Optional[Callable[[dict], None]] = None):
+        """Rebuild the in-memory indexes from an existing archive file.
+
+        Decodes every segment once, calling on_order for each archived order,
+        so run it off the event loop. Unreadable bytes at the end (a frame
+        torn by a crash mid-write) are moved to a sidecar file; unreadable
+        bytes followed by valid frames are corruption and raise.
+        """
+        if not self.path:
+            return
+        self._log.lock()
+        try:
+            offset, end = 0, self._log.size()
+            while offset < end:
+                frame = self._read_frame(offset, end)
+                if frame is None:
+                    self._quarantine_tail(offset, end)
+                    break
+                for order in _decode_segment(frame).values():
+                    self._index(order, (offset, len(frame)))
+                    if on_order is not None:
+                        on_order(order)
+                self.segments += 1
+                offset += len(frame)
+        finally:
+            self._log.unlock()
+
+    def _read_frame(self, offset: int, end: int) -> Optional[bytes]:
+        """The frame at offset if its magic, length and checksum are intact"""
+        if offset + FRAME_HEADER.size > end:
+            return None
+        header = self._log.read(offset, FRAME_HEADER.size)
+        magic, length, checksum = FRAME_HEADER.unpack(header)
+        if magic != FRAME_MAGIC or offset + FRAME_HEADER.size + length > end:
+            return None
+        payload = self._log.read(offset + FRAME_HEADER.size, length)
+        if zlib.crc32(payload) != checksum:
+            return None
+        return header + payload
+
+    def _quarantine_tail(self, offset: int, end: int):
+        """Move unreadable trailing bytes to a sidecar file, or raise if valid frames follow"""
+        tail = self._log.read(offset, end - offset)
+        position = tail.find(FRAME_MAGIC, 1)
+        while position != -1:
+            if self._read_frame(offset + position, end) is not None:
+                raise ValueError(
+                    f"Corrupt archive segment at byte {offset} of {self.path}; "
+                    f"valid segments follow at byte {offset + position}"
+                )
+            position = tail.find(FRAME_MAGIC, position + 1)
+
+        sidecar = f"{self.path}.torn-{offset}-{time.time_ns()}"
+        with open(sidecar, "wb") as f:
+            f.write(tail)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log.truncate(offset)
+        logger.warning(f"Moved {len(tail)} unreadable bytes at the end of {self.path} to {sidecar}")
+
+    def _index(self, order: dict, location: Optional[Tuple[int, int]]):
+        if order["id"] not in self._locations and order["id"] not in self._pending:
+            self._ids.append(order["id"])
+            self._by_user.setdefault(order["user_id"], []).append(order["id"])
+        if location is not None:
+            self._locations[order["id"]] = location
+
+    def stage(self, orders: List[dict]):
+        """Make orders visible in the archive before their segment is written"""
+        for order in orders:
+            self._index(order, None)
+            self._pending[order["id"]] = order
+
+    def _write(self, orders: List[dict]) -> Tuple[int, int]:
+        frame = _encode_segment(orders, self.level)
+        with self._write_lock:
+            return self._log.append(frame), len(frame)
+
+    async def flush(self, threads: int) -> int:
+        """Compress and append staged orders as one segment, off the event loop"""
+        if not self._pending:
+            return 0
+        orders = list(self._pending.values())
+        location = await run_offloaded(self._write, orders, size=len(orders), threshold=1, threads=threads)
+        for order in orders:
+            self._locations[order["id"]] = location
+            self._pending.pop(order["id"], None)
+        self.segments += 1
+        return len(orders)
+
+    def get(self, order_id: str) -> Optional[dict]:
+        order = self._pending.get(order_id)
+        if order is not None:
+            return order
+        location = self._locations.get(order_id)
+        if location is None:
+            return None
+        return self._segment(location).get(order_id)
+
+    def _segment(self, location: Tuple[int, int]) -> Dict[str, dict]:
+        offset, length = location
+        with self._cache_lock:
+            segment = self._cache.get(offset)
+            if segment is not None:
+                self._cache.move_to_end(offset)
+                return segment
+        # Decode outside the lock; page() may run in a worker thread
+        segment = _decode_segment(self._log.read(offset, length))
+        with self._cache_lock:
+            self._cache[offset] = segment
+            while len(self._cache) > self.cache_segments:
+                self._cache.popitem(last=False)
+        return segment
+
+    def __contains__(self, order_id: str) -> bool:
+        return order_id in self._locations or order_id in self._pending
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def user_count(self, user_id: str) -> int:
+        return len(self._by_user.get(user_id, ()))
+
+    def _order_ids(self, user_id: Optional[str]) -> List[str]:
+        return self._by_user.get(user_id, []) if user_id is not None else self._ids
+
+    def iter_orders(self, user_id: Optional[str] = None) -> Iterator[dict]:
+        """Archived orders in archive order, optionally for one user"""
+        for order_id in list(self._order_ids(user_id)):
+            order = self.get(order_id)
+            if order is not None:
+                yield order
+
+    def page(self, user_id: Optional[str], skip: int, limit: int) -> List[dict]:
+        """Archived orders [skip:skip + limit], decoding only the segments on the page"""
+        page_ids = self._order_ids(user_id)[skip:skip + limit]
+        return [order for order in map(self.get, page_ids) if order is not None]
+
+    def stats(self) -> dict:
+        return {
+            "archived_orders": len(self),
+            "archive_segments": self.segments,
+            "archive_bytes": self._log.size(),
+        }
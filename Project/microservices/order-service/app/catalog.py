@@ -0,0 +1,145 @@
+"""
+Interned product catalog and incremental sales aggregates
+
+Order items are stored as (Product, quantity) pairs where each distinct
+(product_id, product_name, price) is a single shared Product, and prices are
+integer cents so totals and revenue never accumulate float rounding drift.
+Products are reference counted by the order lines using them and dropped
+from the catalog once no hot order does.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+import sys
+
+CENT = Decimal("0.01")
+
+# Largest accepted item price; keeps cents exact and Decimal quantization in range
+MAX_PRICE = 1_000_000_000
+
+
+class Product(NamedTuple):
+    product_id: str
+    product_name: str
+    price_cents: int
+
+
+# An order line as stored in orders_db
+OrderLine = Tuple[Product, int]
+
+
+def to_cents(amount: float) -> int:
+    """Convert a decimal currency amount to integer cents, rounding half up"""
+    return int((Decimal(str(amount)).quantize(CENT, rounding=ROUND_HALF_UP) * 100).to_integral_value())
+
+
+def from_cents(cents: int) -> float:
+    return cents / 100
+
+
+class ProductCatalog:
+    """Reference-counted intern table so repeated products share one Product.
+
+    Not thread-safe: intern and release from the event loop only.
+    """
+
+    def __init__(self):
+        self._products: Dict[Tuple[str, str, int], Product] = {}
+        self._refs: Dict[Tuple[str, str, int], int] = {}
+
+    def intern(self, product_id: str, product_name: str, price_cents: int) -> Product:
+        """Return the shared Product for these values, taking one reference"""
+        key = (product_id, product_name, price_cents)
+        product = self._products.get(key)
+        if product is None:
+            product = Product(sys.intern(product_id), sys.intern(product_name), price_cents)
+            self._products[key] = product
+            self._refs[key] = 0
+        self._refs[key] += 1
+        return product
+
+    def release(self, lines: Iterable[OrderLine]):
+        """Drop one reference per line; unreferenced products are forgotten"""
+        for product, _ in lines:
+            # A Product compares equal to its (id, name, price) key
+            refs = self._refs[product] - 1
+            if refs:
+                self._refs[product] = refs
+            else:
+                del self._refs[product]
+                del self._products[product]
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+
+def lines_total_cents(lines: Iterable[OrderLine]) -> int:
+    """Sum price * quantity over order lines in integer cents"""
+    return sum(product.price_cents * quantity for product, quantity in lines)
+
+
+class ProductStats:
+    """Running totals for one product_id"""
+
+    __slots__ = ("units", "revenue_cents", "orders")
+
+    def __init__(self):
+        self.units = 0
+        self.revenue_cents = 0
+        self.orders = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "units_sold": self.units,
+            "revenue_cents": self.revenue_cents,
+            "revenue": from_cents(self.revenue_cents),
+            "orders": self.orders,
+        }
+
+
+class SalesLedger:
+    """Revenue and per-product aggregates, updated as orders come and go"""
+
+    def __init__(self):
+        self.revenue_cents = 0
+        self.orders = 0
+        self.products: Dict[str, ProductStats] = {}
+
+    def _apply(self, lines: List[OrderLine], total_cents: int, sign: int):
+        self.revenue_cents += sign * total_cents
+        self.orders += sign
+        seen = set()
+        for product, quantity in lines:
+            stats = self.products.get(product.product_id)
+            if stats is None:
+                stats = self.products[product.product_id] = ProductStats()
+            stats.units += sign * quantity
+            stats.revenue_cents += sign * product.price_cents * quantity
+            if product.product_id not in seen:
+                seen.add(product.product_id)
+                stats.orders += sign
+
+    def add(self, lines: List[OrderLine], total_cents: int):
+        self._apply(lines, total_cents, 1)
+
+    def remove(self, lines: List[OrderLine], total_cents: int):
+        self._apply(lines, total_cents, -1)
+
+    def merge(self, other: "SalesLedger"):
+        """Add another ledger's totals into this one"""
+        self.revenue_cents += other.revenue_cents
+        self.orders += other.orders
+        for product_id, theirs in other.products.items():
+            stats = self.products.get(product_id)
+            if stats is None:
+                stats = self.products[product_id] = ProductStats()
+            stats.units += theirs.units
+            stats.revenue_cents += theirs.revenue_cents
+            stats.orders += theirs.orders
+
+    def summary(self) -> dict:
+        return {
+            "orders": self.orders,
+            "revenue_cents": self.revenue_cents,
+            "revenue": from_cents(self.revenue_cents),
+            "products": len(self.products),
+        }
@@ -0,0 +1,251 @@
+"""
+Negotiated response compression (zstd, brotli, gzip)
+
+Encodings are picked from Accept-Encoding; brotli and zstd are used only when
+their optional packages are installed. Buffered bodies at or above
+COMPRESSION_OFFLOAD_SIZE bytes are compressed in the worker pool, and streamed
+bodies are compressed chunk by chunk so they keep streaming.
+"""
+from typing import Dict, List, Optional, Tuple
+import time
+import zlib
+
+from app.offload import run_offloaded
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "application/javascript",
+)
+# Structured syntax suffixes (RFC 6839), e.g. application/problem+json
+COMPRESSIBLE_SUFFIXES = ("+json", "+xml")
+
+def is_compressible(content_type: str) -> bool:
+    """Whether a Content-Type value names a text-like media type"""
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith(COMPRESSIBLE_TYPES) or media_type.endswith(COMPRESSIBLE_SUFFIXES)
+
+
+compression_stats: Dict[str, float] = {
+    "responses_compressed": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "cpu_seconds": 0.0,
+}
+
+
+class Encoder:
+    """Incremental compressor for one response body"""
+
+    def __init__(self, encoding: str, levels: Dict[str, int]):
+        self.encoding = encoding
+        if encoding == "zstd":
+            self._obj = zstandard.ZstdCompressor(level=levels["zstd"]).compressobj()
+        elif encoding == "br":
+            self._obj = brotli.Compressor(quality=levels["br"])
+        else:
+            self._obj = zlib.compressobj(levels["gzip"], zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        """Compress a chunk and flush it so the client can decode it right away"""
+        if self.encoding == "zstd":
+            return self._obj.compress(data) + self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        if self.encoding == "br":
+            return self._obj.process(data) + self._obj.flush()
+        return self._obj.compress(data) + self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "zstd":
+            return self._obj.flush()
+        if self.encoding == "br":
+            return self._obj.finish()
+        return self._obj.flush()
+
+
+def available_encodings() -> List[str]:
+    """Supported encodings in server preference order"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding for an Accept-Encoding header"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _compress_body(encoder: Encoder, body: bytes, final: bool) -> Tuple[bytes, float]:
+    started = time.thread_time()
+    data = encoder.compress(body)
+    if final:
+        data += encoder.finish()
+    return data, time.thread_time() - started
+
+
+def _record(bytes_in: int, bytes_out: int, cpu: float):
+    compression_stats["bytes_in"] += bytes_in
+    compression_stats["bytes_out"] += bytes_out
+    compression_stats["cpu_seconds"] += cpu
+
+
+def compression_metrics() -> dict:
+    return {
+        "compression_responses_total": compression_stats["responses_compressed"],
+        "compression_bytes_in_total": compression_stats["bytes_in"],
+        "compression_bytes_out_total": compression_stats["bytes_out"],
+        "compression_bytes_saved_total": compression_stats["bytes_in"] - compression_stats["bytes_out"],
+        "compression_cpu_seconds_total": round(compression_stats["cpu_seconds"], 6),
+    }
+
+
+class CompressionMiddleware:
+    """ASGI middleware applying negotiated compression to large responses"""
+
+    def __init__(self, app, settings):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.settings.compression_enabled:
+            return await self.app(scope, receive, send)
+
+        accept = ""
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept) if accept else None
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        responder = _CompressedResponse(self.settings, encoding, send)
+        await self.app(scope, receive, responder.send_wrapper)
+
+
+class _CompressedResponse:
+    """Per-request state for CompressionMiddleware"""
+
+    def __init__(self, settings, encoding: str, send):
+        self.settings = settings
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.encoder: Optional[Encoder] = None
+        self.passthrough = False
+        self.streaming = False
+
+    def _should_compress(self, headers) -> bool:
+        if self.start_message["status"] in (204, 304):
+            return False
+        content_type = ""
+        for key, value in headers:
+            if key == b"content-encoding":
+                return False
+            if key == b"content-type":
+                content_type = value.decode("latin-1")
+        return is_compressible(content_type)
+
+    def _levels(self) -> Dict[str, int]:
+        return {
+            "zstd": self.settings.zstd_level,
+            "br": self.settings.brotli_quality,
+            "gzip": self.settings.gzip_level,
+        }
+
+    def _compressed_headers(self, content_length: Optional[int]):
+        headers = [
+            (key, value) for key, value in self.start_message["headers"]
+            if key != b"content-length"
+        ]
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", b"Accept-Encoding"))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        return headers
+
+    async def _compress(self, body: bytes, final: bool) -> bytes:
+        data, cpu = await run_offloaded(
+            _compress_body, self.encoder, body, final,
+            size=len(body),
+            threshold=self.settings.compression_offload_size,
+            threads=self.settings.offload_threads
+        )
+        _record(len(body), len(data), cpu)
+        return data
+
+    async def send_wrapper(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = not self._should_compress(message.get("headers", []))
+            if self.passthrough:
+                await self.send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.streaming and not more_body:
+            # Whole body in one message: compress only above the size floor
+            if len(body) < self.settings.compression_min_size:
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            self.encoder = Encoder(self.encoding, self._levels())
+            data = await self._compress(body, final=True)
+            compression_stats["responses_compressed"] += 1
+            self.start_message["headers"] = self._compressed_headers(len(data))
+            await self.send(self.start_message)
+            await self.send({"type": "http.response.body", "body": data})
+            return
+
+        if not self.streaming:
+            # Streaming body: compress each chunk as it arrives
+            self.streaming = True
+            self.encoder = Encoder(self.encoding, self._levels())
+            compression_stats["responses_compressed"] += 1
+            self.start_message["headers"] = self._compressed_headers(None)
+            await self.send(self.start_message)
+
+        data = await self._compress(body, final=not more_body)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
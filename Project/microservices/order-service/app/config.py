@@ -0,0 +1,85 @@
+"""
+Runtime settings for Order Service
+
+Values are read once at startup from the environment, falling back to the file
+named by SETTINGS_FILE (default: .env) and then to the defaults below.
+"""
+from functools import lru_cache
+from pydantic import Field, SecretStr, field_validator, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Literal, Optional
+import os
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+
+    # Service
+    log_level: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
+    docs_enabled: bool = True
+    workers: int = Field(default=1, ge=1, validation_alias="WEB_CONCURRENCY")
+
+    # Upstream user-service
+    user_service_url: str = "http://user-service:8000"  # Kubernetes service name
+    user_service_timeout: float = Field(default=5.0, gt=0)
+    readiness_timeout: float = Field(default=2.0, gt=0)
+    http_max_connections: int = Field(default=100, ge=1)
+    http_max_keepalive_connections: int = Field(default=20, ge=0)
+
+    # Cache of users already verified against user-service. Off by default: while
+    # enabled, a user deleted upstream can still place orders for up to the TTL
+    user_cache_size: int = Field(default=10000, ge=0)
+    user_cache_ttl_seconds: float = Field(default=0.0, ge=0)
+
+    # Pagination
+    default_page_size: int = Field(default=100, ge=1)
+    max_page_size: int = Field(default=1000, ge=1)
+
+    # Event loop protection (an offload threshold of 0 disables offloading)
+    offload_threshold: int = Field(default=500, ge=0)
+    offload_threads: int = Field(default=4, ge=1)
+    loop_lag_budget_ms: float = Field(default=100.0, gt=0)
+    loop_lag_interval_seconds: float = Field(default=0.5, gt=0)
+
+    # Soft deletes and archival: each compaction pass reclaims tombstones in batches
+    # and moves delivered/cancelled orders older than archive_after_seconds into
+    # the compressed archive (kept in memory unless archive_path is set; 0 disables)
+    compaction_interval_seconds: float = Field(default=30.0, gt=0)
+    tombstone_batch_size: int = Field(default=1000, ge=1)
+    archive_after_seconds: float = Field(default=7 * 24 * 3600, ge=0)
+    archive_batch_size: int = Field(default=500, ge=1)
+    archive_path: Optional[str] = None
+    archive_cache_segments: int = Field(default=8, ge=1)
+
+    # Response compression (zstd/brotli are used when their packages are installed)
+    compression_enabled: bool = True
+    compression_min_size: int = Field(default=1024, ge=0)
+    compression_offload_size: int = Field(default=262144, ge=0)
+    gzip_level: int = Field(default=6, ge=1, le=9)
+    brotli_quality: int = Field(default=4, ge=0, le=11)
+    zstd_level: int = Field(default=3, ge=1, le=22)
+
+    # Debug endpoints
+    debug_endpoints_enabled: bool = False
+    debug_token: Optional[SecretStr] = None
+
+    @field_validator("log_level", mode="before")
+    @classmethod
+    def normalize_log_level(cls, value):
+        return value.upper() if isinstance(value, str) else value
+
+    @model_validator(mode="after")
+    def check_page_sizes(self):
+        # FastAPI does not validate Query defaults, so an oversized default would bypass the cap
+        if self.default_page_size > self.max_page_size:
+            raise ValueError(
+                f"default_page_size ({self.default_page_size}) must not exceed "
+                f"max_page_size ({self.max_page_size})"
+            )
+        return self
+
+
+@lru_cache
+def get_settings() -> Settings:
+    """Load settings once; later calls return the same instance"""
+    return Settings(_env_file=os.getenv("SETTINGS_FILE", ".env"))
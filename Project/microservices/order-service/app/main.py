@@ -1,18 +1,34 @@
 """
 Order Service - Manages order operations
 """
-from fastapi import FastAPI, HTTPException, status
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Dict, List, Optional
+import asyncio
 import logging
 import sys
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 import uuid
 import httpx
 
+from app.archive import OrderArchive
+from app.cache import TTLCache
+from app.catalog import MAX_PRICE, OrderLine, Product, ProductCatalog, SalesLedger, from_cents, lines_total_cents, to_cents
+from app.compaction import Compactor, Tombstones
+from app.compression import CompressionMiddleware, compression_metrics
+from app.config import get_settings
+from app.offload import InFlightRequestsMiddleware, LoopLagMonitor, offload_stats, run_offloaded
+from app.pagination import paginate, pagination_headers
+from app.profiling import ProfileRequestMiddleware, create_debug_router, debug_access_guard
+
+settings = get_settings()
+
 # Configure structured logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=settings.log_level,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout)
@@ -20,25 +36,145 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Shared pooled client for user-service calls (created on first use)
+_http_client: Optional[httpx.AsyncClient] = None
+
+loop_monitor = LoopLagMonitor(
+    budget=settings.loop_lag_budget_ms / 1000,
+    interval=settings.loop_lag_interval_seconds
+)
+
+# Users recently confirmed to exist, so repeat orders skip the round trip
+verified_users = TTLCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl_seconds)
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared user-service client, creating it if needed"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            base_url=settings.user_service_url,
+            timeout=settings.user_service_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections
+            )
+        )
+    return _http_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_monitor.start()
+    archive_loader = asyncio.get_running_loop().create_task(load_archive())
+    compactor.start()
+    yield
+    archive_loader.cancel()
+    await compactor.stop()
+    await loop_monitor.stop()
+    if _http_client is not None:
+        await _http_client.aclose()
+
+# OpenAPI schema and docs UIs are built lazily on first request; set
+# DOCS_ENABLED=false to drop the routes entirely in production
 app = FastAPI(
     title="Order Service",
     description="Microservice for order management",
-    version="1.0.0"
+    version="1.0.0",
+    docs_url="/docs" if settings.docs_enabled else None,
+    redoc_url="/redoc" if settings.docs_enabled else None,
+    openapi_url="/openapi.json" if settings.docs_enabled else None,
+    lifespan=lifespan
 )
 
-# Configuration
-USER_SERVICE_URL = "http://user-service:8000"  # Kubernetes service name
-# For local development, use: "http://localhost:8000"
-
 # In-memory storage (replace with database in production)
 orders_db = {}
 
+# Orders in a terminal status become eligible for archival once old enough
+TERMINAL_STATUSES = ("delivered", "cancelled")
+
+# Deleted orders stay in orders_db, hidden from reads, until compaction reclaims them
+order_tombstones = Tombstones(orders_db)
+
+# Terminal order ID -> time it reached that status, oldest first
+terminal_since: Dict[str, float] = {}
+
+# Cold store for old terminal orders (read-only)
+order_archive = OrderArchive(path=settings.archive_path, cache_segments=settings.archive_cache_segments)
+
+def hot_order(order_id: str) -> Optional[dict]:
+    """Return a live order from orders_db, or None if missing or deleted"""
+    if order_id in order_tombstones:
+        return None
+    return orders_db.get(order_id)
+
+# Interned products and running revenue (cancelled orders are excluded)
+catalog = ProductCatalog()
+ledger = SalesLedger()
+
+# Archived orders on disk are indexed, and their sales replayed, in the
+# background after startup; readiness fails until that finishes
+archive_loaded = settings.archive_path is None
+archive_load_error: Optional[str] = None
+
+def load_archive_sales() -> SalesLedger:
+    """Index ARCHIVE_PATH and total its non-cancelled orders (runs in a worker thread)"""
+    sales = SalesLedger()
+    
+    def add_sales(order: dict):
+        if order["status"] != "cancelled":
+            lines = [
+                (Product(item["product_id"], item["product_name"], to_cents(item["price"])), item["quantity"])
+                for item in order["items"]
+            ]
+            sales.add(lines, order["total_cents"])
+    
+    order_archive.load(add_sales)
+    return sales
+
+async def load_archive():
+    """Load the archive off the event loop, then fold its sales into the ledger"""
+    global archive_loaded, archive_load_error
+    started = time.perf_counter()
+    try:
+        sales = await run_offloaded(load_archive_sales, size=1, threshold=1, threads=settings.offload_threads)
+    except Exception as e:
+        archive_load_error = str(e)
+        logger.error(f"Archive load failed: {str(e)}")
+        return
+    ledger.merge(sales)
+    archive_loaded = True
+    logger.info(f"Archive loaded: {len(order_archive)} orders in {time.perf_counter() - started:.2f}s")
+
+# Secondary indexes and counters, kept in step with orders_db on every write
+orders_by_user: Dict[str, Dict[str, dict]] = {}
+status_counts: Dict[str, int] = {}
+
+def index_order(order: dict):
+    """Add an order to the per-user index and status counters"""
+    orders_by_user.setdefault(order["user_id"], {})[order["id"]] = order
+    status_counts[order["status"]] = status_counts.get(order["status"], 0) + 1
+
+def unindex_order(order: dict):
+    """Remove an order from the per-user index and status counters"""
+    user_orders = orders_by_user.get(order["user_id"], {})
+    user_orders.pop(order["id"], None)
+    if not user_orders:
+        orders_by_user.pop(order["user_id"], None)
+    status_counts[order["status"]] -= 1
+    if not status_counts[order["status"]]:
+        del status_counts[order["status"]]
+
+# Guarded on-demand profiling (disabled unless DEBUG_ENDPOINTS_ENABLED is set)
+app.add_middleware(ProfileRequestMiddleware)
+app.include_router(create_debug_router(settings, stores={"orders_db": lambda: orders_db}))
+app.add_middleware(InFlightRequestsMiddleware, monitor=loop_monitor)
+app.add_middleware(CompressionMiddleware, settings=settings)
+
 # Pydantic models
 class OrderItem(BaseModel):
     product_id: str
     product_name: str
     quantity: int
-    price: float
+    price: float = Field(ge=0, le=MAX_PRICE, allow_inf_nan=False)
 
 class OrderCreate(BaseModel):
     user_id: str
@@ -51,6 +187,7 @@ class OrderResponse(BaseModel):
     items: List[OrderItem]
     shipping_address: str
     total_amount: float
+    total_cents: int
     status: str
     created_at: str
     updated_at: str
@@ -59,21 +196,115 @@ class OrderUpdate(BaseModel):
     status: Optional[str] = None
     shipping_address: Optional[str] = None
 
+orders_adapter = TypeAdapter(List[OrderResponse])
+
+def order_view(order: dict) -> dict:
+    """Expand a stored order (interned lines, cents) into the response shape"""
+    return {
+        **order,
+        "items": [
+            {
+                "product_id": product.product_id,
+                "product_name": product.product_name,
+                "quantity": quantity,
+                "price": from_cents(product.price_cents)
+            }
+            for product, quantity in order["items"]
+        ],
+        "total_amount": from_cents(order["total_cents"])
+    }
+
+def as_view(order: dict) -> dict:
+    """Response-shaped order; archived orders are stored already expanded"""
+    return order if "total_amount" in order else order_view(order)
+
+def render_orders(orders: List[dict]) -> bytes:
+    """Validate and serialize a page of orders to JSON"""
+    return orders_adapter.dump_json(orders_adapter.validate_python([as_view(order) for order in orders]))
+
+def intern_items(items: List[OrderItem]) -> List[OrderLine]:
+    """Intern order items into catalog lines (on the event loop; the catalog is not thread-safe)"""
+    # Convert every price first so a failure cannot leave references taken
+    prices = [to_cents(item.price) for item in items]
+    return [
+        (catalog.intern(item.product_id, item.product_name, price_cents), item.quantity)
+        for item, price_cents in zip(items, prices)
+    ]
+
+async def page_with_archive(hot_orders, hot_total: int, skip: int, limit: int, user_id: Optional[str]) -> List[dict]:
+    """Page over hot orders followed by archived ones, decoding the archive off the event loop"""
+    orders = paginate(hot_orders, skip, limit)
+    if len(orders) < limit:
+        orders += await run_offloaded(
+            order_archive.page, user_id, max(skip - hot_total, 0), limit - len(orders),
+            size=1, threshold=1, threads=settings.offload_threads
+        )
+    return orders
+
+async def orders_page_response(request: Request, orders: List[dict], skip: int, limit: int, total: int) -> Response:
+    """Render a page of orders, off the event loop when it carries many items"""
+    body = await run_offloaded(
+        render_orders, orders,
+        size=sum(1 + len(order["items"]) for order in orders),
+        threshold=settings.offload_threshold,
+        threads=settings.offload_threads
+    )
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers=pagination_headers(request, skip, limit, total)
+    )
+
 async def verify_user_exists(user_id: str) -> bool:
     """Verify if user exists in user service"""
+    if verified_users.get(user_id):
+        return True
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{USER_SERVICE_URL}/api/v1/users/{user_id}")
-            if response.status_code == 200:
-                logger.info(f"User {user_id} verified")
-                return True
-            else:
-                logger.warning(f"User {user_id} not found in user service")
-                return False
+        response = await get_http_client().get(f"/api/v1/users/{user_id}")
+        if response.status_code == 200:
+            logger.info(f"User {user_id} verified")
+            verified_users.set(user_id, True)
+            return True
+        else:
+            logger.warning(f"User {user_id} not found in user service")
+            return False
     except Exception as e:
         logger.error(f"Error verifying user: {str(e)}")
         return False
 
+async def compact_orders():
+    """Reclaim deleted orders and archive old terminal ones, in batches"""
+    reclaimed = 0
+    while len(order_tombstones):
+        reclaimed += order_tombstones.reclaim(settings.tombstone_batch_size)
+        await asyncio.sleep(0)
+    
+    archived = 0
+    if settings.archive_after_seconds > 0 and archive_loaded:
+        cutoff = time.time() - settings.archive_after_seconds
+        while True:
+            batch = []
+            for order_id, since in terminal_since.items():
+                if since > cutoff or len(batch) >= settings.archive_batch_size:
+                    break
+                batch.append(order_id)
+            if not batch:
+                break
+            views = []
+            for order_id in batch:
+                del terminal_since[order_id]
+                order = orders_db.pop(order_id)
+                unindex_order(order)
+                views.append(order_view(order))
+                catalog.release(order["items"])
+            order_archive.stage(views)
+            archived += await order_archive.flush(settings.offload_threads)
+    
+    if reclaimed or archived:
+        logger.info(f"Compaction reclaimed {reclaimed} deleted orders and archived {archived} orders")
+
+compactor = Compactor(compact_orders, interval=settings.compaction_interval_seconds)
+
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check endpoint for Kubernetes/Docker"""
@@ -90,21 +321,26 @@ async def readiness_check():
     logger.info("Readiness check requested")
     # Check if user service is accessible
     try:
-        async with httpx.AsyncClient(timeout=2.0) as client:
-            response = await client.get(f"{USER_SERVICE_URL}/health")
-            user_service_healthy = response.status_code == 200
+        response = await get_http_client().get("/health", timeout=settings.readiness_timeout)
+        user_service_healthy = response.status_code == 200
     except Exception as e:
         logger.warning(f"User service not reachable: {str(e)}")
         user_service_healthy = False
     
-    return {
+    result = {
         "status": "ready" if user_service_healthy else "degraded",
         "service": "order-service",
         "dependencies": {
-            "user-service": "healthy" if user_service_healthy else "unhealthy"
+            "user-service": "healthy" if user_service_healthy else "unhealthy",
+            "archive": "loaded" if archive_loaded else ("failed" if archive_load_error else "loading")
         },
         "timestamp": datetime.utcnow().isoformat()
     }
+    # Serving before the archive is indexed would give incomplete orders and revenue
+    if not archive_loaded:
+        result["status"] = "not ready"
+        return JSONResponse(result, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return result
 
 @app.get("/health/live", tags=["Health"])
 async def liveness_check():
@@ -120,17 +356,28 @@ async def liveness_check():
 async def metrics():
     """Prometheus metrics endpoint"""
     logger.info("Metrics requested")
-    status_counts = {}
-    for order in orders_db.values():
-        status = order["status"]
-        status_counts[status] = status_counts.get(status, 0) + 1
-    
     return {
-        "total_orders": len(orders_db),
-        "orders_by_status": status_counts,
+        "total_orders": len(orders_db) - len(order_tombstones),
+        "tombstones": len(order_tombstones),
+        "tombstones_reclaimed_total": order_tombstones.reclaimed_total,
+        **order_archive.stats(),
+        "orders_by_status": dict(status_counts),
+        "user_cache_entries": len(verified_users),
+        "products_interned": len(catalog),
+        "revenue_cents": ledger.revenue_cents,
+        "offload_inline_total": offload_stats["inline"],
+        "offload_offloaded_total": offload_stats["offloaded"],
+        **loop_monitor.stats(),
+        **compression_metrics(),
         "service": "order-service"
     }
 
+@app.get("/admin/config", tags=["Admin"], dependencies=[Depends(debug_access_guard(settings))])
+async def admin_config():
+    """Effective runtime configuration (secrets masked); guarded like /debug/*"""
+    logger.info("Config requested")
+    return settings.model_dump(mode="json")
+
 @app.post("/api/v1/orders", response_model=OrderResponse, status_code=status.HTTP_201_CREATED, tags=["Orders"])
 async def create_order(order: OrderCreate):
     """Create a new order"""
@@ -145,68 +392,105 @@ async def create_order(order: OrderCreate):
         )
     
     # Calculate total amount
-    total_amount = sum(item.price * item.quantity for item in order.items)
+    lines = intern_items(order.items)
+    total_cents = await run_offloaded(
+        lines_total_cents, lines,
+        size=len(lines),
+        threshold=settings.offload_threshold,
+        threads=settings.offload_threads
+    )
     
     order_id = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
     new_order = {
         "id": order_id,
         "user_id": order.user_id,
-        "items": [item.model_dump() for item in order.items],
+        "items": lines,
         "shipping_address": order.shipping_address,
-        "total_amount": total_amount,
+        "total_cents": total_cents,
         "status": "pending",
         "created_at": now,
         "updated_at": now
     }
     orders_db[order_id] = new_order
+    index_order(new_order)
+    ledger.add(lines, total_cents)
     
-    logger.info(f"Order created successfully with ID: {order_id}, Total: ${total_amount:.2f}")
-    return OrderResponse(**new_order)
+    logger.info(f"Order created successfully with ID: {order_id}, Total: ${from_cents(total_cents):.2f}")
+    return OrderResponse(**order_view(new_order))
 
 @app.get("/api/v1/orders", response_model=List[OrderResponse], tags=["Orders"])
-async def list_orders(skip: int = 0, limit: int = 100, user_id: Optional[str] = None):
+async def list_orders(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size),
+    user_id: Optional[str] = None,
+    include_archived: bool = False
+):
     """List all orders with optional filtering by user_id"""
     logger.info(f"Listing orders: skip={skip}, limit={limit}, user_id={user_id}")
     
-    orders = list(orders_db.values())
-    
     # Filter by user_id if provided
     if user_id:
-        orders = [o for o in orders if o["user_id"] == user_id]
+        orders = orders_by_user.get(user_id, {}).values()
+        total = len(orders)
+    else:
+        orders = orders_db.values()
+        total = len(orders_db) - len(order_tombstones)
+        if len(order_tombstones):
+            orders = (order for order in orders if order["id"] not in order_tombstones)
     
-    # Apply pagination
-    orders = orders[skip:skip + limit]
+    # Apply pagination; archived orders follow the hot ones
+    if include_archived:
+        orders = await page_with_archive(orders, total, skip, limit, user_id or None)
+        total += order_archive.user_count(user_id) if user_id else len(order_archive)
+    else:
+        orders = paginate(orders, skip, limit)
     
-    return [OrderResponse(**order) for order in orders]
+    return await orders_page_response(request, orders, skip, limit, total)
 
 @app.get("/api/v1/orders/{order_id}", response_model=OrderResponse, tags=["Orders"])
 async def get_order(order_id: str):
     """Get order by ID"""
     logger.info(f"Fetching order with ID: {order_id}")
     
-    if order_id not in orders_db:
+    order = hot_order(order_id)
+    if order is not None:
+        return OrderResponse(**order_view(order))
+    
+    archived = order_archive.get(order_id)
+    if archived is None:
         logger.warning(f"Order not found: {order_id}")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Order not found"
         )
     
-    return OrderResponse(**orders_db[order_id])
+    return OrderResponse(**archived)
+
+def require_hot_order(order_id: str) -> dict:
+    """Return a live order or raise 404 (missing) / 409 (archived, read-only)"""
+    order = hot_order(order_id)
+    if order is not None:
+        return order
+    if order_id in order_archive:
+        logger.warning(f"Order is archived: {order_id}")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Order is archived and read-only"
+        )
+    logger.warning(f"Order not found: {order_id}")
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Order not found"
+    )
 
 @app.put("/api/v1/orders/{order_id}", response_model=OrderResponse, tags=["Orders"])
 async def update_order(order_id: str, order_update: OrderUpdate):
     """Update order information"""
     logger.info(f"Updating order with ID: {order_id}")
     
-    if order_id not in orders_db:
-        logger.warning(f"Order not found: {order_id}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Order not found"
-        )
-    
-    order = orders_db[order_id]
+    order = require_hot_order(order_id)
     update_data = order_update.model_dump(exclude_unset=True)
     
     # Validate status if provided
@@ -218,37 +502,82 @@ async def update_order(order_id: str, order_update: OrderUpdate):
                 detail=f"Invalid status. Must be one of: {', '.join(valid_statuses)}"
             )
     
+    previous_status = order["status"]
+    was_cancelled = previous_status == "cancelled"
+    unindex_order(order)
     order.update(update_data)
     order["updated_at"] = datetime.utcnow().isoformat()
     orders_db[order_id] = order
+    index_order(order)
+    is_cancelled = order["status"] == "cancelled"
+    if is_cancelled and not was_cancelled:
+        ledger.remove(order["items"], order["total_cents"])
+    elif was_cancelled and not is_cancelled:
+        ledger.add(order["items"], order["total_cents"])
+    if order["status"] != previous_status:
+        terminal_since.pop(order_id, None)
+        if order["status"] in TERMINAL_STATUSES:
+            terminal_since[order_id] = time.time()
     
     logger.info(f"Order {order_id} updated successfully")
-    return OrderResponse(**order)
+    return OrderResponse(**order_view(order))
 
 @app.delete("/api/v1/orders/{order_id}", status_code=status.HTTP_204_NO_CONTENT, tags=["Orders"])
 async def delete_order(order_id: str):
     """Delete an order"""
     logger.info(f"Deleting order with ID: {order_id}")
     
-    if order_id not in orders_db:
-        logger.warning(f"Order not found: {order_id}")
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Order not found"
-        )
-    
-    del orders_db[order_id]
+    order = require_hot_order(order_id)
+    order_tombstones.mark(order_id)
+    terminal_since.pop(order_id, None)
+    unindex_order(order)
+    if order["status"] != "cancelled":
+        ledger.remove(order["items"], order["total_cents"])
+    catalog.release(order["items"])
     logger.info(f"Order {order_id} deleted successfully")
     return None
 
 @app.get("/api/v1/orders/user/{user_id}", response_model=List[OrderResponse], tags=["Orders"])
-async def get_user_orders(user_id: str):
+async def get_user_orders(
+    user_id: str,
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size),
+    include_archived: bool = False
+):
     """Get all orders for a specific user"""
     logger.info(f"Fetching orders for user: {user_id}")
     
-    user_orders = [order for order in orders_db.values() if order["user_id"] == user_id]
+    source = orders_by_user.get(user_id, {})
+    total = len(source)
+    if include_archived:
+        user_orders = await page_with_archive(source.values(), total, skip, limit, user_id)
+        total += order_archive.user_count(user_id)
+    else:
+        user_orders = paginate(source.values(), skip, limit)
+    
+    return await orders_page_response(request, user_orders, skip, limit, total)
+
+@app.get("/api/v1/revenue", tags=["Reports"])
+async def revenue():
+    """Total revenue over non-cancelled orders"""
+    logger.info("Revenue requested")
+    return ledger.summary()
+
+@app.get("/api/v1/products/{product_id}/stats", tags=["Reports"])
+async def product_stats(product_id: str):
+    """Units sold, revenue and order count for a product"""
+    logger.info(f"Fetching stats for product: {product_id}")
+    
+    stats = ledger.products.get(product_id)
+    if stats is None:
+        logger.warning(f"Product not found: {product_id}")
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
     
-    return [OrderResponse(**order) for order in user_orders]
+    return {"product_id": product_id, **stats.as_dict()}
 
 @app.get("/", tags=["Root"])
 async def root():
@@ -256,9 +585,9 @@ async def root():
     return {
         "service": "order-service",
         "version": "1.0.0",
-        "docs": "/docs"
+        "docs": app.docs_url
     }
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8001)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8001, workers=settings.workers)
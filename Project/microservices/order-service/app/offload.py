@@ -0,0 +1,103 @@
+"""
+Keep CPU-heavy work off the event loop
+
+`run_offloaded` moves calls whose input is above a size threshold onto a
+bounded worker thread pool, and `LoopLagMonitor` measures how late the loop
+wakes up so handlers that still block it show up in /metrics and the logs.
+"""
+from typing import Callable, Dict, Optional, TypeVar
+from collections import Counter
+import anyio
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_limiter: Optional[anyio.CapacityLimiter] = None
+offload_stats: Dict[str, int] = {"inline": 0, "offloaded": 0}
+
+
+async def run_offloaded(func: Callable[..., T], *args, size: int, threshold: int, threads: int) -> T:
+    """Call func(*args) inline when small, or in a worker thread when size >= threshold"""
+    global _limiter
+    if threshold <= 0 or size < threshold:
+        offload_stats["inline"] += 1
+        return func(*args)
+    if _limiter is None:
+        _limiter = anyio.CapacityLimiter(threads)
+    offload_stats["offloaded"] += 1
+    return await anyio.to_thread.run_sync(func, *args, limiter=_limiter)
+
+
+class LoopLagMonitor:
+    """Periodically measures event loop scheduling delay"""
+
+    def __init__(self, budget: float, interval: float):
+        self.budget = budget
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.blocked_total = 0
+        self.in_flight: Counter = Counter()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def record(self, lag: float):
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.budget:
+            self.blocked_total += 1
+            paths = ", ".join(sorted(self.in_flight)) or "none"
+            logger.warning(
+                f"Event loop blocked for {lag * 1000:.1f}ms "
+                f"(budget {self.budget * 1000:.0f}ms); in-flight requests: {paths}"
+            )
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(max(loop.time() - started - self.interval, 0.0))
+
+    def stats(self) -> dict:
+        return {
+            "event_loop_lag_seconds": round(self.last_lag, 6),
+            "event_loop_lag_max_seconds": round(self.max_lag, 6),
+            "event_loop_blocked_total": self.blocked_total,
+        }
+
+
+class InFlightRequestsMiddleware:
+    """Track in-flight request paths so lag warnings can name the suspects"""
+
+    def __init__(self, app, monitor: LoopLagMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        key = f'{scope["method"]} {scope["path"]}'
+        in_flight = self.monitor.in_flight
+        in_flight[key] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            in_flight[key] -= 1
+            if not in_flight[key]:
+                del in_flight[key]
@@ -0,0 +1,33 @@
+"""
+Offset pagination helpers
+
+Pages are sliced lazily from the store so a request never materializes more
+than `skip + limit` entries, and totals come from counters maintained on write.
+"""
+from fastapi import Request
+from itertools import islice
+from typing import Dict, Iterable, List
+
+
+def paginate(items: Iterable, skip: int, limit: int) -> List:
+    """Return items[skip:skip + limit] without copying the whole iterable"""
+    return list(islice(items, skip, skip + limit))
+
+
+def pagination_headers(request: Request, skip: int, limit: int, total: int) -> Dict[str, str]:
+    """Build X-Total-Count and RFC 8288 Link headers for an offset page"""
+    def page_url(page_skip: int) -> str:
+        return str(request.url.include_query_params(skip=page_skip, limit=limit))
+
+    links = [f'<{page_url(0)}>; rel="first"']
+    if skip > 0:
+        links.append(f'<{page_url(max(skip - limit, 0))}>; rel="prev"')
+    if skip + limit < total:
+        links.append(f'<{page_url(skip + limit)}>; rel="next"')
+        last_skip = ((total - 1) // limit) * limit
+        links.append(f'<{page_url(last_skip)}>; rel="last"')
+
+    return {
+        "X-Total-Count": str(total),
+        "Link": ", ".join(links),
+    }
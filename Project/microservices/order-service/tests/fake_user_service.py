@@ -0,0 +1,177 @@
+"""
+Fake User Service for order-service tests and benchmarks
+
+Implements the slice of the user-service API that order-service consumes (see
+contracts/user_service.json) with injectable latency, error rate and
+throughput limits. Use `FakeUserService.app` in-process, or
+`running_fake_user_service()` to serve it over real HTTP on localhost.
+"""
+from contextlib import contextmanager
+from datetime import datetime
+from fastapi import Depends, FastAPI, HTTPException, status
+from pydantic import BaseModel
+from typing import Iterator, Optional
+from collections import Counter
+import asyncio
+import random
+import socket
+import threading
+import time
+import uuid
+import uvicorn
+
+
+class FakeUserCreate(BaseModel):
+    name: str
+    email: str
+    age: Optional[int] = None
+
+
+class FakeUserService:
+    """In-memory user-service stand-in with tunable failure modes.
+
+    Attributes can be changed between (or during) requests:
+        latency: seconds added to every request, plus up to `jitter` seconds
+        error_rate: fraction of requests answered with 500
+        max_rps: requests per second admitted; excess requests queue
+        max_concurrency: requests served at once; excess requests queue
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        max_rps: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.max_concurrency = max_concurrency
+        self.url: Optional[str] = None
+        self.users = {}
+        self.requests: Counter = Counter()
+        self._random = random.Random(seed)
+        self._next_slot = 0.0
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.app = self._build_app()
+
+    def add_user(self, name: str = "Fake User", email: Optional[str] = None) -> dict:
+        user_id = str(uuid.uuid4())
+        user = {
+            "id": user_id,
+            "name": name,
+            "email": email or f"{user_id}@example.com",
+            "age": None,
+            "created_at": datetime.utcnow().isoformat()
+        }
+        self.users[user_id] = user
+        return user
+
+    def reset(self):
+        self.users.clear()
+        self.requests.clear()
+        self._next_slot = 0.0
+
+    async def _simulate(self):
+        """Apply throughput limits, latency and error injection to a request"""
+        if self.max_rps:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.max_rps
+            if slot > now:
+                await asyncio.sleep(slot - now)
+
+        if self.max_concurrency:
+            if self._semaphore is None:
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            async with self._semaphore:
+                await self._delay()
+        else:
+            await self._delay()
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.requests["error"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Injected failure"
+            )
+
+    async def _delay(self):
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _build_app(self) -> FastAPI:
+        app = FastAPI(title="Fake User Service")
+        simulate = Depends(self._simulate)
+
+        @app.get("/health", dependencies=[simulate])
+        async def health_check():
+            self.requests["health"] += 1
+            return {
+                "status": "healthy",
+                "service": "user-service",
+                "timestamp": datetime.utcnow().isoformat()
+            }
+
+        @app.post("/api/v1/users", status_code=status.HTTP_201_CREATED, dependencies=[simulate])
+        async def create_user(user: FakeUserCreate):
+            self.requests["create_user"] += 1
+            created = self.add_user(name=user.name, email=user.email)
+            created["age"] = user.age
+            return created
+
+        @app.get("/api/v1/users/{user_id}", dependencies=[simulate])
+        async def get_user(user_id: str):
+            self.requests["get_user"] += 1
+            if user_id not in self.users:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="User not found"
+                )
+            return self.users[user_id]
+
+        return app
+
+
+def _free_port(host: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def running_fake_user_service(
+    service: Optional[FakeUserService] = None,
+    host: str = "127.0.0.1",
+    port: Optional[int] = None
+) -> Iterator[FakeUserService]:
+    """Serve a FakeUserService over HTTP in a background thread.
+
+    The yielded service has a `url` attribute with its base URL.
+    """
+    service = service or FakeUserService()
+    port = port or _free_port(host)
+    config = uvicorn.Config(
+        service.app, host=host, port=port,
+        loop="asyncio", ws="none", lifespan="off", log_level="warning"
+    )
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="fake-user-service", daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("Fake user service failed to start")
+        time.sleep(0.01)
+
+    service.url = f"http://{host}:{port}"
+    try:
+        yield service
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
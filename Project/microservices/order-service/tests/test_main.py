@@ -1,10 +1,14 @@
 """
 Unit tests for Order Service
 """
+import json
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, AsyncMock
-from app.main import app
+from app import main
+from app.main import app, settings
+from fake_user_service import FakeUserService, running_fake_user_service
+from user_service_contract import field_mismatches, verify_user_service_contract
 
 client = TestClient(app)
 
@@ -15,6 +19,31 @@ def mock_user_service():
         mock.return_value = True
         yield mock
 
+@pytest.fixture
+def fake_user_service(monkeypatch):
+    """Serve a fake user service on localhost and point order-service at it"""
+    with running_fake_user_service(FakeUserService(seed=1)) as fake:
+        monkeypatch.setattr(settings, "user_service_url", fake.url)
+        monkeypatch.setattr(main, "_http_client", None)
+        main.verified_users.clear()
+        yield fake
+    main.verified_users.clear()
+
+def order_payload(user_id):
+    """Minimal order request body for user_id"""
+    return {
+        "user_id": user_id,
+        "items": [
+            {
+                "product_id": "prod-1",
+                "product_name": "Test Product",
+                "quantity": 1,
+                "price": 10.99
+            }
+        ],
+        "shipping_address": "123 Test St"
+    }
+
 def test_health_check():
     """Test health check endpoint"""
     response = client.get("/health")
@@ -45,6 +74,61 @@ def test_metrics():
     data = response.json()
     assert "total_orders" in data
 
+def test_admin_config(monkeypatch):
+    """Test effective config endpoint"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", None)
+    response = client.get("/admin/config")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["user_service_url"] == settings.user_service_url
+    assert data["user_service_timeout"] == settings.user_service_timeout
+
+def test_admin_config_guarded(monkeypatch):
+    """Test config endpoint is hidden when disabled and requires the debug token"""
+    from pydantic import SecretStr
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", False)
+    assert client.get("/admin/config").status_code == 404
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", SecretStr("secret"))
+    assert client.get("/admin/config").status_code == 403
+    assert client.get("/admin/config", headers={"X-Debug-Token": "secret"}).status_code == 200
+
+def test_default_page_size_cannot_exceed_max(monkeypatch):
+    """Test settings reject a default page size above the cap"""
+    from pydantic import ValidationError
+    from app.config import Settings
+    monkeypatch.setenv("MAX_PAGE_SIZE", "50")
+    with pytest.raises(ValidationError):
+        Settings()
+    monkeypatch.setenv("DEFAULT_PAGE_SIZE", "50")
+    assert Settings().default_page_size == 50
+
+def test_settings_from_environment(monkeypatch):
+    """Test settings are read from the environment"""
+    from app.config import Settings
+    monkeypatch.setenv("USER_SERVICE_URL", "http://localhost:8000")
+    monkeypatch.setenv("USER_SERVICE_TIMEOUT", "1.5")
+    monkeypatch.setenv("HTTP_MAX_CONNECTIONS", "10")
+    loaded = Settings()
+    assert loaded.user_service_url == "http://localhost:8000"
+    assert loaded.user_service_timeout == 1.5
+    assert loaded.http_max_connections == 10
+
+def test_ttl_cache_expiry_and_eviction(monkeypatch):
+    """Test verified-user cache honours TTL and size limits"""
+    from app import cache
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    users = cache.TTLCache(maxsize=2, ttl=10)
+    users.set("a", True)
+    users.set("b", True)
+    users.set("c", True)
+    assert users.get("a") is None
+    assert users.get("c") is True
+    now[0] += 11
+    assert users.get("c") is None
+
 def test_create_order(mock_user_service):
     """Test order creation"""
     order_data = {
@@ -245,3 +329,592 @@ def test_get_user_orders(mock_user_service):
     data = response.json()
     assert len(data) >= 2
     assert all(order["user_id"] == user_id for order in data)
+
+def test_debug_endpoints_disabled_by_default(monkeypatch):
+    """Test debug endpoints are hidden unless explicitly enabled"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", False)
+    assert client.get("/debug/profile?seconds=0.1").status_code == 404
+    assert client.get("/debug/memory").status_code == 404
+
+def test_debug_profile(monkeypatch):
+    """Test profile capture returns collapsed stacks"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", None)
+    response = client.get("/debug/profile?seconds=0.2&interval=0.01")
+    assert response.status_code == 200
+    assert int(response.headers["X-Profile-Samples"]) > 0
+
+def test_debug_memory(monkeypatch):
+    """Test memory report includes the orders store"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", None)
+    response = client.get("/debug/memory")
+    assert response.status_code == 200
+    data = response.json()
+    assert "orders_db" in data["stores"]
+    assert data["stores"]["orders_db"]["entries"] >= 0
+
+def test_list_orders_pagination_headers(mock_user_service):
+    """Test list orders by user returns total count and Link headers"""
+    user_id = "paging-user"
+    for i in range(3):
+        order_data = {
+            "user_id": user_id,
+            "items": [
+                {
+                    "product_id": f"prod-{i}",
+                    "product_name": f"Product {i}",
+                    "quantity": 1,
+                    "price": 10.99
+                }
+            ],
+            "shipping_address": "Test Address"
+        }
+        client.post("/api/v1/orders", json=order_data)
+
+    response = client.get(f"/api/v1/orders?user_id={user_id}&skip=0&limit=2")
+    assert response.status_code == 200
+    assert len(response.json()) == 2
+    assert response.headers["X-Total-Count"] == "3"
+    assert 'rel="next"' in response.headers["Link"]
+    assert 'rel="prev"' not in response.headers["Link"]
+
+    response = client.get(f"/api/v1/orders/user/{user_id}?skip=2&limit=2")
+    assert len(response.json()) == 1
+    assert response.headers["X-Total-Count"] == "3"
+    assert 'rel="next"' not in response.headers["Link"]
+
+def test_list_orders_invalid_pagination():
+    """Test list orders rejects negative and oversized pages"""
+    assert client.get("/api/v1/orders?skip=-5").status_code == 422
+    response = client.get(f"/api/v1/orders?limit={settings.max_page_size + 1}")
+    assert response.status_code == 422
+
+def test_metrics_status_counters(mock_user_service):
+    """Test status counters follow creates, updates and deletes"""
+    before = client.get("/metrics").json()["orders_by_status"]
+    order_data = {
+        "user_id": "counter-user",
+        "items": [
+            {
+                "product_id": "prod-1",
+                "product_name": "Test Product",
+                "quantity": 1,
+                "price": 10.99
+            }
+        ],
+        "shipping_address": "Test Address"
+    }
+    order_id = client.post("/api/v1/orders", json=order_data).json()["id"]
+    client.put(f"/api/v1/orders/{order_id}", json={"status": "shipped"})
+    after = client.get("/metrics").json()["orders_by_status"]
+    assert after["shipped"] == before.get("shipped", 0) + 1
+    assert after.get("pending", 0) == before.get("pending", 0)
+
+    client.delete(f"/api/v1/orders/{order_id}")
+    assert client.get("/metrics").json()["orders_by_status"].get("shipped", 0) == before.get("shipped", 0)
+
+def test_create_large_order_offloaded(mock_user_service, monkeypatch):
+    """Test large orders compute their total in the worker pool"""
+    from app.offload import offload_stats
+    monkeypatch.setattr(settings, "offload_threshold", 10)
+    before = offload_stats["offloaded"]
+    order_data = {
+        "user_id": "bulk-user",
+        "items": [
+            {
+                "product_id": f"prod-{i}",
+                "product_name": f"Product {i}",
+                "quantity": 1,
+                "price": 2.0
+            }
+            for i in range(20)
+        ],
+        "shipping_address": "Test Address"
+    }
+    response = client.post("/api/v1/orders", json=order_data)
+    assert response.status_code == 201
+    assert response.json()["total_amount"] == 40.0
+    assert offload_stats["offloaded"] == before + 1
+
+    response = client.get("/api/v1/orders/user/bulk-user")
+    assert response.status_code == 200
+    assert len(response.json()[0]["items"]) == 20
+    assert offload_stats["offloaded"] == before + 2
+
+def test_metrics_event_loop_lag():
+    """Test event loop lag metrics are exported"""
+    data = client.get("/metrics").json()
+    assert "event_loop_lag_seconds" in data
+    assert "event_loop_blocked_total" in data
+
+def create_bulk_order(user_id, item_count):
+    """Create an order with many items so list responses are large"""
+    order_data = {
+        "user_id": user_id,
+        "items": [
+            {
+                "product_id": f"prod-{i}",
+                "product_name": f"Product {i}",
+                "quantity": 1,
+                "price": 1.0
+            }
+            for i in range(item_count)
+        ],
+        "shipping_address": "Test Address"
+    }
+    return client.post("/api/v1/orders", json=order_data)
+
+def test_list_orders_gzip(mock_user_service):
+    """Test large list responses are gzip-compressed when requested"""
+    import gzip
+    create_bulk_order("gzip-user", 50)
+    response = client.get(
+        "/api/v1/orders/user/gzip-user",
+        headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert len(response.json()[0]["items"]) == 50
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert "X-Total-Count" in response.headers
+
+def test_list_orders_zstd_preferred(mock_user_service):
+    """Test zstd is chosen when the client accepts it and raw bodies decode"""
+    import json
+    import zstandard
+    create_bulk_order("zstd-user", 50)
+    with client.stream(
+        "GET",
+        "/api/v1/orders/user/zstd-user",
+        headers={"Accept-Encoding": "gzip;q=0.5, zstd"}
+    ) as response:
+        assert response.headers["content-encoding"] == "zstd"
+        raw = b"".join(response.iter_raw())
+    data = json.loads(zstandard.ZstdDecompressor().decompressobj().decompress(raw))
+    assert len(data[0]["items"]) == 50
+
+def test_small_responses_not_compressed():
+    """Test responses below the size threshold are sent as-is"""
+    response = client.get("/health", headers={"Accept-Encoding": "gzip, br, zstd"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+def test_compression_streaming_and_metrics():
+    """Test streamed bodies are compressed chunk by chunk and metrics recorded"""
+    import zlib
+    from fastapi import FastAPI
+    from fastapi.responses import StreamingResponse
+    from app.compression import CompressionMiddleware, compression_metrics
+
+    before = compression_metrics()
+    stream_app = FastAPI()
+    stream_app.add_middleware(CompressionMiddleware, settings=settings)
+
+    @stream_app.get("/export")
+    async def export():
+        async def rows():
+            for i in range(100):
+                yield f'{{"row": {i}, "padding": "{"x" * 50}"}}\n'.encode()
+        return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+    @stream_app.get("/export.json")
+    async def export_json():
+        async def rows():
+            for i in range(100):
+                yield f'{{"row": {i}}}\n'.encode()
+        return StreamingResponse(rows(), media_type="application/json")
+
+    @stream_app.get("/export.png")
+    async def export_png():
+        async def chunks():
+            for i in range(100):
+                yield b"\x89PNG" * 16
+        return StreamingResponse(chunks(), media_type="image/png")
+
+    stream_client = TestClient(stream_app)
+    with stream_client.stream("GET", "/export", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        raw = b"".join(response.iter_raw())
+    assert len(zlib.decompress(raw, 31).decode().splitlines()) == 100
+
+    response = stream_client.get("/export.png", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers  # not a compressible type
+
+    with stream_client.stream("GET", "/export.json", headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        raw = b"".join(response.iter_raw())
+    lines = zlib.decompress(raw, 31).decode().splitlines()
+    assert len(lines) == 100
+
+    after = compression_metrics()
+    assert after["compression_responses_total"] == before["compression_responses_total"] + 2
+    assert after["compression_bytes_in_total"] > before["compression_bytes_in_total"]
+    assert "compression_cpu_seconds_total" in after
+
+def test_fake_user_service_honours_contract(fake_user_service):
+    """Test the fake answers every interaction in the user-service contract"""
+    import httpx
+    with httpx.Client(base_url=fake_user_service.url) as http:
+        verify_user_service_contract(http)
+
+def test_contract_field_types():
+    """Test contract fields are checked against their declared types"""
+    fields = {"id": "string", "age": "integer|null", "active": "boolean"}
+    assert field_mismatches({"id": "u1", "age": None, "active": True}, fields) == []
+    assert field_mismatches({"id": "u1", "age": 30, "active": False}, fields) == []
+    assert field_mismatches({"id": 1, "age": True, "active": "yes"}, fields) == [
+        "id: expected string, got int",
+        "age: expected integer|null, got bool",
+        "active: expected boolean, got str",
+    ]
+    assert field_mismatches({}, {"id": "string"}) == ["id: missing"]
+    with pytest.raises(ValueError):
+        field_mismatches({"id": "u1"}, {"id": "uuid"})
+
+def test_create_order_real_user_lookup(fake_user_service, monkeypatch):
+    """Test order creation verifies the user over HTTP and caches the result"""
+    monkeypatch.setattr(main.verified_users, "ttl", 30.0)
+    user = fake_user_service.add_user()
+    with TestClient(app) as live_client:
+        assert live_client.post("/api/v1/orders", json=order_payload(user["id"])).status_code == 201
+        assert live_client.post("/api/v1/orders", json=order_payload(user["id"])).status_code == 201
+        assert live_client.post("/api/v1/orders", json=order_payload("unknown-user")).status_code == 404
+    assert fake_user_service.requests["get_user"] == 2
+
+def test_user_cache_staleness_window(fake_user_service, monkeypatch):
+    """Test the user cache is off by default, and when on accepts deleted users until the TTL"""
+    assert settings.user_cache_ttl_seconds == 0
+    user = fake_user_service.add_user()
+    with TestClient(app) as live_client:
+        assert live_client.post("/api/v1/orders", json=order_payload(user["id"])).status_code == 201
+        del fake_user_service.users[user["id"]]
+        assert live_client.post("/api/v1/orders", json=order_payload(user["id"])).status_code == 404
+
+        monkeypatch.setattr(main.verified_users, "ttl", 30.0)
+        cached = fake_user_service.add_user()
+        assert live_client.post("/api/v1/orders", json=order_payload(cached["id"])).status_code == 201
+        del fake_user_service.users[cached["id"]]
+        # Deleted upstream, but still accepted from the cache until the TTL passes
+        assert live_client.post("/api/v1/orders", json=order_payload(cached["id"])).status_code == 201
+
+def test_create_order_user_service_errors(fake_user_service):
+    """Test upstream 500s are treated as an unverifiable user"""
+    user = fake_user_service.add_user()
+    fake_user_service.error_rate = 1.0
+    with TestClient(app) as live_client:
+        response = live_client.post("/api/v1/orders", json=order_payload(user["id"]))
+    assert response.status_code == 404
+    assert fake_user_service.requests["error"] == 1
+
+def test_create_order_user_service_timeout(fake_user_service, monkeypatch):
+    """Test a slow user service hits the configured timeout"""
+    user = fake_user_service.add_user()
+    fake_user_service.latency = 1.0
+    monkeypatch.setattr(settings, "user_service_timeout", 0.1)
+    with TestClient(app) as live_client:
+        response = live_client.post("/api/v1/orders", json=order_payload(user["id"]))
+    assert response.status_code == 404
+
+def test_readiness_with_user_service(fake_user_service):
+    """Test readiness reports the user service dependency as healthy"""
+    with TestClient(app) as live_client:
+        data = live_client.get("/health/ready").json()
+    assert data["status"] == "ready"
+    assert data["dependencies"]["user-service"] == "healthy"
+
+def test_fake_user_service_throughput_limit(fake_user_service):
+    """Test the fake queues requests above its rate limit"""
+    import time
+    import httpx
+    fake_user_service.max_rps = 20
+    started = time.perf_counter()
+    with httpx.Client(base_url=fake_user_service.url) as http:
+        for _ in range(6):
+            assert http.get("/health").status_code == 200
+    assert time.perf_counter() - started >= 0.2
+
+def test_order_totals_in_cents(mock_user_service):
+    """Test totals are computed in integer cents without float drift"""
+    order_data = {
+        "user_id": "cents-user",
+        "items": [
+            {"product_id": "dime", "product_name": "Dime", "quantity": 3, "price": 0.1},
+            {"product_id": "nickel", "product_name": "Nickel", "quantity": 1, "price": 0.2}
+        ],
+        "shipping_address": "Test Address"
+    }
+    response = client.post("/api/v1/orders", json=order_data)
+    assert response.status_code == 201
+    data = response.json()
+    assert data["total_cents"] == 50
+    assert data["total_amount"] == 0.5
+    assert data["items"][0] == {"product_id": "dime", "product_name": "Dime", "quantity": 3, "price": 0.1}
+
+def test_order_items_share_interned_products(mock_user_service):
+    """Test repeated products are stored once in the catalog"""
+    order_data = {
+        "user_id": "intern-user",
+        "items": [{"product_id": "shared", "product_name": "Shared", "quantity": 1, "price": 5.0}],
+        "shipping_address": "Test Address"
+    }
+    first = client.post("/api/v1/orders", json=order_data).json()["id"]
+    second = client.post("/api/v1/orders", json=order_data).json()["id"]
+    assert main.orders_db[first]["items"][0][0] is main.orders_db[second]["items"][0][0]
+
+def test_catalog_releases_unused_products(mock_user_service):
+    """Test products leave the catalog once no order references them"""
+    order_data = {
+        "user_id": "release-user",
+        "items": [
+            {"product_id": "released", "product_name": "Released", "quantity": 1, "price": 3.0},
+            {"product_id": "released", "product_name": "Released", "quantity": 2, "price": 3.0}
+        ],
+        "shipping_address": "Test Address"
+    }
+    before = len(main.catalog)
+    first = client.post("/api/v1/orders", json=order_data).json()["id"]
+    second = client.post("/api/v1/orders", json=order_data).json()["id"]
+    assert len(main.catalog) == before + 1
+
+    client.delete(f"/api/v1/orders/{first}")
+    assert len(main.catalog) == before + 1
+    client.delete(f"/api/v1/orders/{second}")
+    assert len(main.catalog) == before
+
+def test_revenue_and_product_stats(mock_user_service):
+    """Test revenue aggregates follow creates, cancellations and deletes"""
+    before = client.get("/api/v1/revenue").json()
+    order_data = {
+        "user_id": "revenue-user",
+        "items": [{"product_id": "stats-prod", "product_name": "Stats", "quantity": 4, "price": 2.5}],
+        "shipping_address": "Test Address"
+    }
+    order_id = client.post("/api/v1/orders", json=order_data).json()["id"]
+    client.post("/api/v1/orders", json=order_data)
+
+    stats = client.get("/api/v1/products/stats-prod/stats").json()
+    assert stats == {
+        "product_id": "stats-prod",
+        "units_sold": 8,
+        "revenue_cents": 2000,
+        "revenue": 20.0,
+        "orders": 2
+    }
+    after = client.get("/api/v1/revenue").json()
+    assert after["revenue_cents"] == before["revenue_cents"] + 2000
+    assert after["orders"] == before["orders"] + 2
+
+    client.put(f"/api/v1/orders/{order_id}", json={"status": "cancelled"})
+    assert client.get("/api/v1/products/stats-prod/stats").json()["units_sold"] == 4
+    client.put(f"/api/v1/orders/{order_id}", json={"status": "pending"})
+    assert client.get("/api/v1/products/stats-prod/stats").json()["units_sold"] == 8
+
+    client.delete(f"/api/v1/orders/{order_id}")
+    assert client.get("/api/v1/products/stats-prod/stats").json()["revenue_cents"] == 1000
+    assert client.get("/api/v1/revenue").json()["revenue_cents"] == before["revenue_cents"] + 1000
+
+def test_product_stats_unknown_product():
+    """Test stats for a product never ordered"""
+    response = client.get("/api/v1/products/never-ordered/stats")
+    assert response.status_code == 404
+
+def test_create_order_rejects_invalid_prices(mock_user_service):
+    """Test out-of-range and non-finite prices are rejected before interning"""
+    before = len(main.catalog)
+    for price in (1e300, -1, "inf", "NaN"):
+        order_data = {
+            "user_id": "price-user",
+            "items": [
+                {"product_id": "valid-first", "product_name": "Valid", "quantity": 1, "price": 1.0},
+                {"product_id": "bad-price", "product_name": "Bad", "quantity": 1, "price": price}
+            ],
+            "shipping_address": "Test Address"
+        }
+        response = client.post("/api/v1/orders", json=order_data)
+        assert response.status_code == 422, price
+    assert len(main.catalog) == before
+
+def test_to_cents_rounding():
+    """Test currency amounts round half up to the cent"""
+    from app.catalog import to_cents
+    assert to_cents(10.99) == 1099
+    assert to_cents(0.005) == 1
+    assert to_cents(1.234) == 123
+    assert to_cents(19.999) == 2000
+
+def test_delete_order_tombstone_reclaimed(mock_user_service):
+    """Test deleted orders are hidden at once and reclaimed by compaction"""
+    import asyncio
+    order_id = client.post("/api/v1/orders", json=order_payload("tombstone-user")).json()["id"]
+
+    assert client.delete(f"/api/v1/orders/{order_id}").status_code == 204
+    assert order_id in main.order_tombstones
+    assert client.get(f"/api/v1/orders/{order_id}").status_code == 404
+    assert client.delete(f"/api/v1/orders/{order_id}").status_code == 404
+    assert order_id not in [o["id"] for o in client.get("/api/v1/orders?limit=1000").json()]
+    assert client.get("/metrics").json()["tombstones"] >= 1
+
+    asyncio.run(main.compact_orders())
+    assert order_id not in main.orders_db
+    assert len(main.order_tombstones) == 0
+
+def test_archive_old_terminal_orders(mock_user_service, monkeypatch):
+    """Test old delivered orders move to the archive and stay readable"""
+    import asyncio
+    order_id = client.post("/api/v1/orders", json=order_payload("archive-user")).json()["id"]
+    client.put(f"/api/v1/orders/{order_id}", json={"status": "delivered"})
+    assert order_id in main.terminal_since
+
+    monkeypatch.setattr(settings, "archive_after_seconds", 60)
+    main.terminal_since[order_id] -= 120
+    asyncio.run(main.compact_orders())
+
+    assert order_id not in main.orders_db
+    assert order_id in main.order_archive
+    response = client.get(f"/api/v1/orders/{order_id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "delivered"
+    assert response.json()["total_amount"] == 10.99
+
+    assert client.put(f"/api/v1/orders/{order_id}", json={"status": "pending"}).status_code == 409
+    assert client.delete(f"/api/v1/orders/{order_id}").status_code == 409
+
+    hot = client.get("/api/v1/orders/user/archive-user")
+    assert order_id not in [o["id"] for o in hot.json()]
+    archived = client.get("/api/v1/orders/user/archive-user?include_archived=true")
+    assert order_id in [o["id"] for o in archived.json()]
+    assert int(archived.headers["x-total-count"]) == int(hot.headers["x-total-count"]) + 1
+    assert client.get("/metrics").json()["archived_orders"] >= 1
+
+def test_order_archive_file_round_trip(tmp_path):
+    """Test an on-disk archive is rebuilt from its segments on restart"""
+    import asyncio
+    from app.archive import OrderArchive
+    path = str(tmp_path / "orders.archive")
+    archive = OrderArchive(path)
+    archive.stage([{"id": "a1", "user_id": "u1"}, {"id": "a2", "user_id": "u2"}])
+    asyncio.run(archive.flush(threads=1))
+    archive.stage([{"id": "a3", "user_id": "u1"}])
+    asyncio.run(archive.flush(threads=1))
+
+    reopened = OrderArchive(path)
+    reopened.load()
+    assert len(reopened) == 3
+    assert reopened.segments == 2
+    assert reopened.get("a2") == {"id": "a2", "user_id": "u2"}
+    assert [o["id"] for o in reopened.iter_orders("u1")] == ["a1", "a3"]
+    assert reopened.user_count("u2") == 1
+    assert reopened.get("missing") is None
+
+def test_order_archive_truncates_torn_tail(tmp_path):
+    """Test a partly written final segment is dropped instead of failing startup"""
+    import asyncio
+    import os
+    from app.archive import OrderArchive
+    path = str(tmp_path / "orders.archive")
+    archive = OrderArchive(path)
+    archive.stage([{"id": "t1", "user_id": "u1"}])
+    asyncio.run(archive.flush(threads=1))
+    first_segment_size = os.path.getsize(path)
+    archive.stage([{"id": "t2", "user_id": "u1"}])
+    asyncio.run(archive.flush(threads=1))
+    os.truncate(path, os.path.getsize(path) - 3)
+
+    torn_size = os.path.getsize(path) - first_segment_size
+
+    reopened = OrderArchive(path)
+    reopened.load()
+    assert len(reopened) == 1
+    assert "t2" not in reopened
+    assert os.path.getsize(path) == first_segment_size
+    sidecars = list(tmp_path.glob("orders.archive.torn-*"))
+    assert len(sidecars) == 1
+    assert sidecars[0].stat().st_size == torn_size
+
+    reopened.stage([{"id": "t3", "user_id": "u1"}])
+    asyncio.run(reopened.flush(threads=1))
+    restarted = OrderArchive(path)
+    restarted.load()
+    assert [o["id"] for o in restarted.iter_orders("u1")] == ["t1", "t3"]
+
+def test_order_archive_page_skips_without_decoding(monkeypatch):
+    """Test archive pages only decode the segments they return"""
+    import asyncio
+    from app import archive as archive_module
+    archive = archive_module.OrderArchive(cache_segments=1)
+    for segment in range(3):
+        archive.stage([{"id": f"p{segment}-{i}", "user_id": "u1"} for i in range(10)])
+        asyncio.run(archive.flush(threads=1))
+
+    decoded = []
+    decode = archive_module._decode_segment
+    monkeypatch.setattr(archive_module, "_decode_segment", lambda frame: decoded.append(1) or decode(frame))
+    page = archive.page(None, 25, 10)
+    assert [o["id"] for o in page] == [f"p2-{i}" for i in range(5, 10)]
+    assert len(decoded) == 1
+    assert [o["id"] for o in archive.page("u1", 9, 2)] == ["p0-9", "p1-0"]
+
+def test_archived_sales_restored_on_startup(tmp_path, monkeypatch):
+    """Test revenue and product stats include archived orders after a restart"""
+    import asyncio
+    from app.archive import OrderArchive
+    from app.catalog import SalesLedger
+    path = str(tmp_path / "orders.archive")
+    archive = OrderArchive(path)
+    item = {"product_id": "archived-prod", "product_name": "Archived", "quantity": 2, "price": 1.25}
+    archive.stage([
+        {"id": "r1", "user_id": "u1", "items": [item], "total_cents": 250, "status": "delivered"},
+        {"id": "r2", "user_id": "u1", "items": [item], "total_cents": 250, "status": "cancelled"},
+    ])
+    asyncio.run(archive.flush(threads=1))
+
+    monkeypatch.setattr(settings, "archive_path", path)
+    monkeypatch.setattr(main, "order_archive", OrderArchive(path))
+    monkeypatch.setattr(main, "ledger", SalesLedger())
+    monkeypatch.setattr(main, "archive_loaded", False)
+    assert client.get("/health/ready").status_code == 503
+
+    asyncio.run(main.load_archive())
+    assert main.archive_loaded is True
+    assert client.get("/health/ready").json()["dependencies"]["archive"] == "loaded"
+    assert main.ledger.summary()["revenue_cents"] == 250
+    assert main.ledger.summary()["orders"] == 1
+    assert main.ledger.products["archived-prod"].units == 2
+
+def test_order_archive_shared_file_offsets(tmp_path):
+    """Test two archives appending to one file record their own segment offsets"""
+    import asyncio
+    from app.archive import OrderArchive
+    path = str(tmp_path / "orders.archive")
+    first, second = OrderArchive(path), OrderArchive(path)
+    first.stage([{"id": "w1", "user_id": "u1"}])
+    second.stage([{"id": "w2", "user_id": "u2"}])
+    asyncio.run(second.flush(threads=1))
+    asyncio.run(first.flush(threads=1))
+    first._cache.clear()
+    second._cache.clear()
+    assert first.get("w1") == {"id": "w1", "user_id": "u1"}
+    assert second.get("w2") == {"id": "w2", "user_id": "u2"}
+
+def test_order_archive_corruption_before_valid_segments(tmp_path):
+    """Test a corrupt frame followed by valid ones raises and leaves the file intact"""
+    import asyncio
+    import os
+    from app.archive import OrderArchive
+    path = str(tmp_path / "orders.archive")
+    archive = OrderArchive(path)
+    for segment in range(3):
+        archive.stage([{"id": f"c{segment}", "user_id": "u1"}])
+        asyncio.run(archive.flush(threads=1))
+    size = os.path.getsize(path)
+
+    with open(path, "r+b") as f:
+        f.seek(4)  # first byte of the first frame's length field
+        f.write(b"\xff")
+    with pytest.raises(ValueError, match="valid segments follow"):
+        OrderArchive(path).load()
+    assert os.path.getsize(path) == size
+    assert not list(tmp_path.glob("orders.archive.torn-*"))
@@ -0,0 +1,69 @@
+"""
+Checker for the user-service contract order-service relies on
+
+contracts/user_service.json lists the requests order-service makes and the
+status and field types it expects back. `verify_user_service_contract` replays
+those interactions against any client with the httpx/TestClient interface, so
+the fake (here) and the real service (user-service tests) are held to the same
+contract.
+"""
+from pathlib import Path
+from typing import Dict, List
+import json
+
+CONTRACT_PATH = Path(__file__).parent / "contracts" / "user_service.json"
+
+# Contract type names -> accepted Python types of the decoded JSON value
+FIELD_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+    "null": (type(None),),
+}
+
+
+def load_contract() -> dict:
+    return json.loads(CONTRACT_PATH.read_text())
+
+
+def _matches(value, declared: str) -> bool:
+    """Whether value has the declared type; unions are written "integer|null" """
+    for name in declared.split("|"):
+        if name not in FIELD_TYPES:
+            raise ValueError(f"Unknown contract field type: {name!r}")
+        # bool is a subclass of int, but JSON true is not an integer
+        if isinstance(value, bool) and name in ("integer", "number"):
+            continue
+        if isinstance(value, FIELD_TYPES[name]):
+            return True
+    return False
+
+
+def field_mismatches(body: dict, fields: Dict[str, str]) -> List[str]:
+    """Describe every field of body that is missing or has the wrong type"""
+    problems = []
+    for field, declared in fields.items():
+        if field not in body:
+            problems.append(f"{field}: missing")
+        elif not _matches(body[field], declared):
+            problems.append(f"{field}: expected {declared}, got {type(body[field]).__name__}")
+    return problems
+
+
+def verify_user_service_contract(http, contract: dict = None):
+    """Replay every contract interaction through `http` and assert the responses"""
+    contract = contract or load_contract()
+    for interaction in contract["interactions"]:
+        description = interaction["description"]
+        path = interaction["request"]["path"]
+        if interaction.get("given") == "user exists":
+            user = http.post("/api/v1/users", json={"name": "Contract", "email": "contract@example.com"}).json()
+            path = path.format(user_id=user["id"])
+        response = http.request(interaction["request"]["method"], path)
+        expected = interaction["response"]
+        assert response.status_code == expected["status"], description
+        problems = field_mismatches(response.json(), expected.get("fields", {}))
+        assert not problems, f"{description}: {', '.join(problems)}"
@@ -0,0 +1,74 @@
+"""
+Soft deletes and background compaction
+
+Deleting a record only marks it with a tombstone; the record stays in its store
+(hidden from reads) until a background Compactor reclaims tombstones in
+bounded batches, so deletes are O(1) and never stall the event loop.
+"""
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Tombstones:
+    """Deleted keys of a dict store, reclaimed oldest first"""
+
+    def __init__(self, store: dict):
+        self.store = store
+        self._deleted_at: Dict[str, float] = {}
+        self.reclaimed_total = 0
+
+    def mark(self, key: str):
+        self._deleted_at[key] = time.time()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._deleted_at
+
+    def __len__(self) -> int:
+        return len(self._deleted_at)
+
+    def reclaim(self, batch_size: int) -> int:
+        """Remove up to batch_size tombstoned records from the store"""
+        reclaimed = 0
+        while self._deleted_at and reclaimed < batch_size:
+            key = next(iter(self._deleted_at))
+            del self._deleted_at[key]
+            self.store.pop(key, None)
+            reclaimed += 1
+        self.reclaimed_total += reclaimed
+        return reclaimed
+
+
+class Compactor:
+    """Runs an async compaction pass every `interval` seconds"""
+
+    def __init__(self, compact: Callable[[], Awaitable[None]], interval: float):
+        self.compact = compact
+        self.interval = interval
+        self.runs_total = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.compact()
+                self.runs_total += 1
+            except Exception as e:
+                logger.error(f"Compaction failed: {str(e)}")
@@ -1,18 +1,29 @@
 """
 User Service - Manages user operations
 """
-from fastapi import FastAPI, HTTPException, status
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, TypeAdapter
 from typing import List, Optional
 import logging
+import asyncio
 import sys
+from contextlib import asynccontextmanager
 from datetime import datetime
 import uuid
 
+from app.compaction import Compactor, Tombstones
+from app.compression import CompressionMiddleware, compression_metrics
+from app.config import get_settings
+from app.offload import InFlightRequestsMiddleware, LoopLagMonitor, offload_stats, run_offloaded
+from app.pagination import paginate, pagination_headers
+from app.profiling import ProfileRequestMiddleware, create_debug_router, debug_access_guard
+
+settings = get_settings()
+
 # Configure structured logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=settings.log_level,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout)
@@ -20,15 +31,60 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+loop_monitor = LoopLagMonitor(
+    budget=settings.loop_lag_budget_ms / 1000,
+    interval=settings.loop_lag_interval_seconds
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop_monitor.start()
+    compactor.start()
+    yield
+    await compactor.stop()
+    await loop_monitor.stop()
+
+# OpenAPI schema and docs UIs are built lazily on first request; set
+# DOCS_ENABLED=false to drop the routes entirely in production
 app = FastAPI(
     title="User Service",
     description="Microservice for user management",
-    version="1.0.0"
+    version="1.0.0",
+    docs_url="/docs" if settings.docs_enabled else None,
+    redoc_url="/redoc" if settings.docs_enabled else None,
+    openapi_url="/openapi.json" if settings.docs_enabled else None,
+    lifespan=lifespan
 )
 
 # In-memory storage (replace with database in production)
 users_db = {}
 
+# Email -> user ID index, so uniqueness checks do not scan users_db
+users_by_email = {}
+
+# Deleted users stay in users_db, hidden from reads, until compaction reclaims them
+user_tombstones = Tombstones(users_db)
+
+async def compact_users():
+    """Reclaim tombstoned users in batches, yielding to the event loop between them"""
+    reclaimed = 0
+    while len(user_tombstones):
+        reclaimed += user_tombstones.reclaim(settings.tombstone_batch_size)
+        await asyncio.sleep(0)
+    if reclaimed:
+        logger.info(f"Reclaimed {reclaimed} deleted users")
+
+compactor = Compactor(compact_users, interval=settings.compaction_interval_seconds)
+
+def user_exists(user_id: str) -> bool:
+    return user_id in users_db and user_id not in user_tombstones
+
+# Guarded on-demand profiling (disabled unless DEBUG_ENDPOINTS_ENABLED is set)
+app.add_middleware(ProfileRequestMiddleware)
+app.include_router(create_debug_router(settings, stores={"users_db": lambda: users_db}))
+app.add_middleware(InFlightRequestsMiddleware, monitor=loop_monitor)
+app.add_middleware(CompressionMiddleware, settings=settings)
+
 # Pydantic models
 class UserCreate(BaseModel):
     name: str
@@ -47,6 +103,12 @@ class UserUpdate(BaseModel):
     email: Optional[EmailStr] = None
     age: Optional[int] = None
 
+users_adapter = TypeAdapter(List[UserResponse])
+
+def render_users(users: List[dict]) -> bytes:
+    """Validate and serialize a page of users to JSON"""
+    return users_adapter.dump_json(users_adapter.validate_python(users))
+
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Health check endpoint for Kubernetes/Docker"""
@@ -83,23 +145,34 @@ async def metrics():
     """Prometheus metrics endpoint"""
     logger.info("Metrics requested")
     return {
-        "total_users": len(users_db),
+        "total_users": len(users_db) - len(user_tombstones),
+        "tombstones": len(user_tombstones),
+        "tombstones_reclaimed_total": user_tombstones.reclaimed_total,
+        "offload_inline_total": offload_stats["inline"],
+        "offload_offloaded_total": offload_stats["offloaded"],
+        **loop_monitor.stats(),
+        **compression_metrics(),
         "service": "user-service"
     }
 
+@app.get("/admin/config", tags=["Admin"], dependencies=[Depends(debug_access_guard(settings))])
+async def admin_config():
+    """Effective runtime configuration (secrets masked); guarded like /debug/*"""
+    logger.info("Config requested")
+    return settings.model_dump(mode="json")
+
 @app.post("/api/v1/users", response_model=UserResponse, status_code=status.HTTP_201_CREATED, tags=["Users"])
 async def create_user(user: UserCreate):
     """Create a new user"""
     logger.info(f"Creating user with email: {user.email}")
     
     # Check if user already exists
-    for existing_user in users_db.values():
-        if existing_user["email"] == user.email:
-            logger.warning(f"User with email {user.email} already exists")
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="User with this email already exists"
-            )
+    if user.email in users_by_email:
+        logger.warning(f"User with email {user.email} already exists")
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="User with this email already exists"
+        )
     
     user_id = str(uuid.uuid4())
     new_user = {
@@ -110,23 +183,41 @@ async def create_user(user: UserCreate):
         "created_at": datetime.utcnow().isoformat()
     }
     users_db[user_id] = new_user
+    users_by_email[user.email] = user_id
     
     logger.info(f"User created successfully with ID: {user_id}")
     return UserResponse(**new_user)
 
 @app.get("/api/v1/users", response_model=List[UserResponse], tags=["Users"])
-async def list_users(skip: int = 0, limit: int = 100):
+async def list_users(
+    request: Request,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(settings.default_page_size, ge=1, le=settings.max_page_size)
+):
     """List all users with pagination"""
     logger.info(f"Listing users: skip={skip}, limit={limit}")
-    users = list(users_db.values())[skip:skip + limit]
-    return [UserResponse(**user) for user in users]
+    live_users = users_db.values()
+    if len(user_tombstones):
+        live_users = (user for user in live_users if user["id"] not in user_tombstones)
+    users = paginate(live_users, skip, limit)
+    body = await run_offloaded(
+        render_users, users,
+        size=len(users),
+        threshold=settings.offload_threshold,
+        threads=settings.offload_threads
+    )
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers=pagination_headers(request, skip, limit, len(users_db) - len(user_tombstones))
+    )
 
 @app.get("/api/v1/users/{user_id}", response_model=UserResponse, tags=["Users"])
 async def get_user(user_id: str):
     """Get user by ID"""
     logger.info(f"Fetching user with ID: {user_id}")
     
-    if user_id not in users_db:
+    if not user_exists(user_id):
         logger.warning(f"User not found: {user_id}")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -140,7 +231,7 @@ async def update_user(user_id: str, user_update: UserUpdate):
     """Update user information"""
     logger.info(f"Updating user with ID: {user_id}")
     
-    if user_id not in users_db:
+    if not user_exists(user_id):
         logger.warning(f"User not found: {user_id}")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -152,13 +243,14 @@ async def update_user(user_id: str, user_update: UserUpdate):
     
     # Check email uniqueness if email is being updated
     if "email" in update_data:
-        for existing_user in users_db.values():
-            if existing_user["id"] != user_id and existing_user["email"] == update_data["email"]:
-                logger.warning(f"Email {update_data['email']} already exists")
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail="Email already in use"
-                )
+        if users_by_email.get(update_data["email"], user_id) != user_id:
+            logger.warning(f"Email {update_data['email']} already exists")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Email already in use"
+            )
+        del users_by_email[user["email"]]
+        users_by_email[update_data["email"]] = user_id
     
     user.update(update_data)
     users_db[user_id] = user
@@ -171,14 +263,15 @@ async def delete_user(user_id: str):
     """Delete a user"""
     logger.info(f"Deleting user with ID: {user_id}")
     
-    if user_id not in users_db:
+    if not user_exists(user_id):
         logger.warning(f"User not found: {user_id}")
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
     
-    del users_db[user_id]
+    del users_by_email[users_db[user_id]["email"]]
+    user_tombstones.mark(user_id)
     logger.info(f"User {user_id} deleted successfully")
     return None
 
@@ -188,9 +281,9 @@ async def root():
     return {
         "service": "user-service",
         "version": "1.0.0",
-        "docs": "/docs"
+        "docs": app.docs_url
     }
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run("app.main:app", host="0.0.0.0", port=8000, workers=settings.workers)
@@ -0,0 +1,325 @@
+"""
+On-demand profiling endpoints for live services
+
+Nothing runs while idle: the sampler thread and tracemalloc only run for the
+bounded duration of a capture.
+"""
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from typing import Callable, Dict, List, Optional
+from collections import Counter
+from itertools import islice
+import asyncio
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+
+from app.offload import run_offloaded
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_SECONDS = 10.0
+MAX_PROFILE_SECONDS = 60.0
+MAX_PROFILE_REQUESTS = 10000
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_MEMORY_SAMPLE = 1000
+MAX_MEMORY_SAMPLE = 10000
+MAX_MEMORY_TOP = 100
+
+# Leaf frames of threads parked waiting for work; their samples are dropped
+IDLE_FRAMES = {
+    ("selectors", "select"),
+    ("threading", "wait"),
+    ("queue", "get"),
+}
+
+
+class SamplingProfiler:
+    """Wall-clock stack sampler producing collapsed (folded) stacks.
+
+    The output is the `frame;frame;frame count` format consumed by
+    flamegraph.pl, inferno and speedscope.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.idle_samples = 0
+        self.requests_seen = 0
+        self.requests_target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._done: Optional[asyncio.Event] = None
+
+    def start(self, requests_target: Optional[int] = None):
+        self.requests_target = requests_target
+        self._done = asyncio.Event()
+        self._thread = threading.Thread(target=self._run, name="debug-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def record_request(self):
+        """Count a finished request; completes the capture once the target is reached"""
+        self.requests_seen += 1
+        if self.requests_target is not None and self.requests_seen >= self.requests_target:
+            self._done.set()
+
+    async def wait(self, seconds: float):
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    def _run(self):
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if (frame.f_globals.get("__name__"), frame.f_code.co_name) in IDLE_FRAMES:
+                    self.idle_samples += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                thread_name = names.get(thread_id)
+                if thread_name is None:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                    thread_name = names.get(thread_id, str(thread_id))
+                stack.append(thread_name)
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+# Currently running capture, if any
+_active_profiler: Optional[SamplingProfiler] = None
+_memory_trace_active = False
+
+
+class ProfileRequestMiddleware:
+    """Feed request completions to an active 'next N requests' capture.
+
+    Plain ASGI middleware so the idle cost is a single attribute check.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        await self.app(scope, receive, send)
+        profiler = _active_profiler
+        if profiler is not None and profiler.requests_target is not None and scope["type"] == "http":
+            if not scope["path"].startswith("/debug/"):
+                profiler.record_request()
+
+
+def _deep_sizeof(obj, seen=None) -> int:
+    """Approximate retained size of a container of plain Python objects"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _deep_sizeof(key, seen) + _deep_sizeof(value, seen)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for item in obj:
+            size += _deep_sizeof(item, seen)
+    return size
+
+
+def _estimate_store_bytes(store_size: int, container_bytes: int, sample: list) -> int:
+    """Extrapolate a store's retained size from the deep size of a sample of its entries"""
+    if not sample:
+        return container_bytes
+    seen = set()
+    sample_bytes = sum(_deep_sizeof(key, seen) + _deep_sizeof(value, seen) for key, value in sample)
+    return container_bytes + sample_bytes * store_size // len(sample)
+
+
+def _top_allocators(top: int) -> List[dict]:
+    """Snapshot tracemalloc and summarize the largest allocation sites"""
+    stats = tracemalloc.take_snapshot().statistics("lineno")[:top]
+    return [
+        {
+            "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_bytes": stat.size,
+            "count": stat.count,
+        }
+        for stat in stats
+    ]
+
+
+def debug_access_guard(settings) -> Callable[[Optional[str]], None]:
+    """Dependency hiding a route unless DEBUG_ENDPOINTS_ENABLED, and requiring DEBUG_TOKEN if set"""
+
+    def check_access(x_debug_token: Optional[str] = Header(None)):
+        if not settings.debug_endpoints_enabled:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+        token = settings.debug_token
+        if token is not None and x_debug_token != token.get_secret_value():
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid debug token")
+
+    return check_access
+
+
+def create_debug_router(settings, stores: Dict[str, Callable[[], dict]]) -> APIRouter:
+    """Build the /debug router; `stores` maps a store name to a getter for it"""
+    router = APIRouter(prefix="/debug", tags=["Debug"])
+    check_access = debug_access_guard(settings)
+
+    @router.get("/profile", response_class=PlainTextResponse)
+    async def profile(
+        seconds: Optional[float] = None,
+        requests: Optional[int] = None,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+        x_debug_token: Optional[str] = Header(None),
+    ):
+        """Sample stacks for N seconds, or until the next N requests complete.
+
+        `seconds` defaults to 10, or to the 60 second cap for a requests-based
+        capture, and always bounds it. Threads idling in select/wait/get are
+        not sampled. Returns collapsed stacks suitable for flamegraph tooling.
+        """
+        global _active_profiler
+        check_access(x_debug_token)
+
+        if seconds is None:
+            seconds = MAX_PROFILE_SECONDS if requests is not None else DEFAULT_PROFILE_SECONDS
+
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"seconds must be between 0 and {MAX_PROFILE_SECONDS:g}"
+            )
+        if requests is not None and not 0 < requests <= MAX_PROFILE_REQUESTS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"requests must be between 1 and {MAX_PROFILE_REQUESTS}"
+            )
+        if not 0.001 <= interval <= 1.0:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="interval must be between 0.001 and 1.0 seconds"
+            )
+        if _active_profiler is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A profile capture is already running"
+            )
+
+        logger.info(f"Starting profile capture: seconds={seconds}, requests={requests}, interval={interval}")
+        profiler = SamplingProfiler(interval=interval)
+        _active_profiler = profiler
+        started = time.perf_counter()
+        try:
+            profiler.start(requests_target=requests)
+            await profiler.wait(seconds)
+        finally:
+            profiler.stop()
+            _active_profiler = None
+        elapsed = time.perf_counter() - started
+
+        logger.info(f"Profile capture finished: {profiler.sample_count} samples in {elapsed:.2f}s")
+        return PlainTextResponse(
+            profiler.collapsed(),
+            headers={
+                "X-Profile-Samples": str(profiler.sample_count),
+                "X-Profile-Idle-Samples": str(profiler.idle_samples),
+                "X-Profile-Requests": str(profiler.requests_seen),
+                "X-Profile-Duration": f"{elapsed:.3f}",
+            }
+        )
+
+    @router.get("/memory")
+    async def memory(
+        top: int = 20,
+        seconds: float = 0.0,
+        sample: int = DEFAULT_MEMORY_SAMPLE,
+        x_debug_token: Optional[str] = Header(None),
+    ):
+        """Report store sizes and, with seconds > 0, the top allocation sites.
+
+        Store sizes are extrapolated from `sample` entries per store, sized in
+        a worker thread. When `seconds` is set, tracemalloc runs for that long
+        only and the snapshot is summarized in a worker thread.
+        """
+        global _memory_trace_active
+        check_access(x_debug_token)
+
+        if not 0 <= seconds <= MAX_PROFILE_SECONDS:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"seconds must be between 0 and {MAX_PROFILE_SECONDS:g}"
+            )
+
+        if not 0 < sample <= MAX_MEMORY_SAMPLE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"sample must be between 1 and {MAX_MEMORY_SAMPLE}"
+            )
+        if not 0 <= top <= MAX_MEMORY_TOP:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"top must be between 0 and {MAX_MEMORY_TOP}"
+            )
+
+        store_sizes = {}
+        for name, get_store in stores.items():
+            store = get_store()
+            # Copy the sample on the loop; sizing it runs in a worker thread
+            entries = list(islice(store.items(), sample))
+            store_sizes[name] = {
+                "entries": len(store),
+                "sampled_entries": len(entries),
+                "approx_bytes": await run_offloaded(
+                    _estimate_store_bytes, len(store), sys.getsizeof(store), entries,
+                    size=1, threshold=1, threads=settings.offload_threads
+                ),
+            }
+
+        result = {"stores": store_sizes}
+        if seconds > 0:
+            if _memory_trace_active:
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="A memory trace is already running"
+                )
+            # Leave tracing alone if it was enabled outside this endpoint (PYTHONTRACEMALLOC)
+            owns_tracing = not tracemalloc.is_tracing()
+            logger.info(f"Starting memory trace: seconds={seconds}")
+            _memory_trace_active = True
+            try:
+                if owns_tracing:
+                    tracemalloc.start()
+                await asyncio.sleep(seconds)
+                current, peak = tracemalloc.get_traced_memory()
+                result["traced_seconds"] = seconds
+                result["traced_bytes"] = current
+                result["traced_peak_bytes"] = peak
+                result["top_allocators"] = await run_offloaded(
+                    _top_allocators, top, size=1, threshold=1, threads=settings.offload_threads
+                )
+            finally:
+                if owns_tracing:
+                    tracemalloc.stop()
+                _memory_trace_active = False
+        result["tracing"] = tracemalloc.is_tracing()
+        return result
+
+    return router
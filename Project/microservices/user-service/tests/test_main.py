@@ -3,7 +3,8 @@ Unit tests for User Service
 """
 import pytest
 from fastapi.testclient import TestClient
-from app.main import app
+from pydantic import SecretStr
+from app.main import app, settings
 
 client = TestClient(app)
 
@@ -36,6 +37,50 @@ def test_metrics():
     data = response.json()
     assert "total_users" in data
 
+def test_admin_config(monkeypatch):
+    """Test effective config endpoint masks secrets"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", None)
+    response = client.get("/admin/config")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["max_page_size"] == settings.max_page_size
+    assert "log_level" in data
+
+def test_admin_config_guarded(monkeypatch):
+    """Test config endpoint is hidden when disabled and requires the debug token"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", False)
+    assert client.get("/admin/config").status_code == 404
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", SecretStr("secret"))
+    assert client.get("/admin/config").status_code == 403
+    assert client.get("/admin/config", headers={"X-Debug-Token": "wrong"}).status_code == 403
+    assert client.get("/admin/config", headers={"X-Debug-Token": "secret"}).status_code == 200
+
+def test_default_page_size_cannot_exceed_max(monkeypatch):
+    """Test settings reject a default page size above the cap"""
+    from pydantic import ValidationError
+    from app.config import Settings
+    monkeypatch.setenv("MAX_PAGE_SIZE", "50")
+    with pytest.raises(ValidationError):
+        Settings()
+    monkeypatch.setenv("DEFAULT_PAGE_SIZE", "50")
+    assert Settings().default_page_size == 50
+
+def test_settings_from_environment(monkeypatch):
+    """Test settings are read from the environment"""
+    from app.config import Settings
+    monkeypatch.setenv("LOG_LEVEL", "debug")
+    monkeypatch.setenv("MAX_PAGE_SIZE", "50")
+    monkeypatch.setenv("DEFAULT_PAGE_SIZE", "20")
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("DEBUG_TOKEN", "secret")
+    loaded = Settings()
+    assert loaded.log_level == "DEBUG"
+    assert loaded.max_page_size == 50
+    assert loaded.workers == 4
+    assert loaded.model_dump(mode="json")["debug_token"] != "secret"
+
 def test_create_user():
     """Test user creation"""
     user_data = {
@@ -144,3 +189,210 @@ def test_delete_user():
     # Verify user is deleted
     get_response = client.get(f"/api/v1/users/{user_id}")
     assert get_response.status_code == 404
+
+def test_debug_endpoints_disabled_by_default(monkeypatch):
+    """Test debug endpoints are hidden unless explicitly enabled"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", False)
+    assert client.get("/debug/profile?seconds=0.1").status_code == 404
+    assert client.get("/debug/memory").status_code == 404
+
+def test_debug_endpoints_require_token(monkeypatch):
+    """Test debug token is enforced when configured"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", SecretStr("secret"))
+    assert client.get("/debug/memory").status_code == 403
+    response = client.get("/debug/memory", headers={"X-Debug-Token": "secret"})
+    assert response.status_code == 200
+
+def test_debug_profile(monkeypatch):
+    """Test profile capture returns collapsed stacks"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", None)
+    response = client.get("/debug/profile?seconds=0.2&interval=0.01")
+    assert response.status_code == 200
+    assert int(response.headers["X-Profile-Samples"]) > 0
+    for line in response.text.strip().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack
+        assert int(count) > 0
+
+def test_debug_profile_invalid_duration(monkeypatch):
+    """Test profile capture rejects out-of-range durations"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", None)
+    response = client.get("/debug/profile?seconds=600")
+    assert response.status_code == 400
+
+def test_debug_memory(monkeypatch):
+    """Test memory report includes store sizes and tracemalloc allocators"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", None)
+    response = client.get("/debug/memory?seconds=0.1&top=5")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["tracing"] is False  # stopped once the capture ends
+    assert data["traced_seconds"] == 0.1
+    assert "users_db" in data["stores"]
+    assert "entries" in data["stores"]["users_db"]
+    assert len(data["top_allocators"]) <= 5
+
+    response = client.get("/debug/memory")
+    assert "top_allocators" not in response.json()
+    assert client.get("/debug/memory?seconds=600").status_code == 400
+
+def test_profiler_skips_idle_threads():
+    """Test threads parked in a wait are left out of profiles"""
+    import threading
+    import time
+    from app.profiling import SamplingProfiler
+    stop = threading.Event()
+    waiter = threading.Thread(target=stop.wait, name="idle-waiter", daemon=True)
+    waiter.start()
+    profiler = SamplingProfiler(interval=0.005)
+    profiler.start()
+    time.sleep(0.1)
+    profiler.stop()
+    stop.set()
+    assert profiler.idle_samples > 0
+    assert not any(stack.startswith("idle-waiter") for stack in profiler.samples)
+
+def test_debug_memory_samples_store(monkeypatch):
+    """Test store sizes are extrapolated from a bounded sample"""
+    monkeypatch.setattr(settings, "debug_endpoints_enabled", True)
+    monkeypatch.setattr(settings, "debug_token", None)
+    for i in range(3):
+        client.post("/api/v1/users", json={"name": f"Sized {i}", "email": f"sized{i}@example.com"})
+    store = client.get("/debug/memory?sample=1").json()["stores"]["users_db"]
+    assert store["sampled_entries"] == 1
+    assert store["approx_bytes"] > 0
+    assert client.get("/debug/memory?sample=0").status_code == 400
+    assert client.get("/debug/memory?top=1000").status_code == 400
+
+def test_list_users_pagination_headers():
+    """Test list users returns total count and Link headers"""
+    for i in range(3):
+        client.post("/api/v1/users", json={"name": f"Page {i}", "email": f"page{i}@example.com"})
+
+    response = client.get("/api/v1/users?skip=1&limit=1")
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    total = int(response.headers["X-Total-Count"])
+    assert total >= 3
+    link = response.headers["Link"]
+    assert 'rel="first"' in link
+    assert 'rel="prev"' in link
+    assert 'rel="next"' in link
+    assert "skip=2" in link
+
+def test_list_users_invalid_pagination():
+    """Test list users rejects negative and oversized pages"""
+    assert client.get("/api/v1/users?skip=-1").status_code == 422
+    assert client.get("/api/v1/users?limit=0").status_code == 422
+    response = client.get(f"/api/v1/users?limit={settings.max_page_size + 1}")
+    assert response.status_code == 422
+
+def test_update_user_email_conflict():
+    """Test email uniqueness is enforced on update and freed on delete"""
+    first = client.post("/api/v1/users", json={"name": "First", "email": "first@example.com"}).json()
+    second = client.post("/api/v1/users", json={"name": "Second", "email": "second@example.com"}).json()
+
+    response = client.put(f"/api/v1/users/{second['id']}", json={"email": "first@example.com"})
+    assert response.status_code == 409
+
+    response = client.put(f"/api/v1/users/{second['id']}", json={"email": "renamed@example.com"})
+    assert response.status_code == 200
+    response = client.post("/api/v1/users", json={"name": "Reuse", "email": "second@example.com"})
+    assert response.status_code == 201
+
+    client.delete(f"/api/v1/users/{first['id']}")
+    response = client.post("/api/v1/users", json={"name": "Again", "email": "first@example.com"})
+    assert response.status_code == 201
+
+def test_list_users_offloaded(monkeypatch):
+    """Test large pages are serialized in the worker pool"""
+    from app.offload import offload_stats
+    monkeypatch.setattr(settings, "offload_threshold", 1)
+    before = offload_stats["offloaded"]
+    client.post("/api/v1/users", json={"name": "Offload", "email": "offload@example.com"})
+    response = client.get("/api/v1/users")
+    assert response.status_code == 200
+    assert all("email" in user for user in response.json())
+    assert offload_stats["offloaded"] == before + 1
+
+def test_loop_lag_monitor_flags_blocking():
+    """Test lag above budget is counted as blocking"""
+    from app.offload import LoopLagMonitor
+    monitor = LoopLagMonitor(budget=0.05, interval=0.5)
+    monitor.record(0.01)
+    assert monitor.blocked_total == 0
+    monitor.record(0.2)
+    stats = monitor.stats()
+    assert stats["event_loop_blocked_total"] == 1
+    assert stats["event_loop_lag_max_seconds"] == 0.2
+
+def test_list_users_compressed():
+    """Test large user lists are compressed and small responses are not"""
+    for i in range(30):
+        client.post("/api/v1/users", json={"name": f"Bulk {i}", "email": f"bulk{i}@example.com"})
+    response = client.get("/api/v1/users", headers={"Accept-Encoding": "br;q=0.9, gzip;q=0.1"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "br"
+    assert len(response.json()) >= 30
+
+    response = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    metrics = client.get("/metrics").json()
+    assert metrics["compression_bytes_saved_total"] > 0
+
+def test_choose_encoding():
+    """Test Accept-Encoding negotiation honours q-values"""
+    from app.compression import choose_encoding
+    assert choose_encoding("gzip") == "gzip"
+    assert choose_encoding("gzip, br") == "br"
+    assert choose_encoding("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*") == "zstd"
+
+def test_compressible_content_types():
+    """Test JSON, NDJSON and +json media types are compressed, binaries are not"""
+    from app.compression import is_compressible
+    assert is_compressible("application/json; charset=utf-8")
+    assert is_compressible("application/x-ndjson")
+    assert is_compressible("application/problem+json")
+    assert not is_compressible("image/png")
+
+def test_order_service_contract():
+    """Test user-service honours the contract order-service relies on"""
+    import sys
+    from pathlib import Path
+    consumer_tests = Path(__file__).resolve().parents[2] / "order-service" / "tests"
+    if not (consumer_tests / "user_service_contract.py").exists():
+        pytest.skip("order-service contract not available")
+    sys.path.insert(0, str(consumer_tests))
+    try:
+        from user_service_contract import verify_user_service_contract
+    finally:
+        sys.path.remove(str(consumer_tests))
+    verify_user_service_contract(client)
+
+def test_delete_user_tombstone_reclaimed():
+    """Test deleted users are hidden at once and reclaimed by compaction"""
+    import asyncio
+    from app import main
+    user_id = client.post("/api/v1/users", json={"name": "Soft", "email": "soft@example.com"}).json()["id"]
+    assert client.delete(f"/api/v1/users/{user_id}").status_code == 204
+
+    assert user_id in main.users_db
+    assert client.get(f"/api/v1/users/{user_id}").status_code == 404
+    assert client.put(f"/api/v1/users/{user_id}", json={"name": "Ghost"}).status_code == 404
+    assert client.delete(f"/api/v1/users/{user_id}").status_code == 404
+    listed = client.get(f"/api/v1/users?limit={settings.max_page_size}")
+    assert user_id not in [user["id"] for user in listed.json()]
+    assert int(listed.headers["X-Total-Count"]) == len(main.users_db) - len(main.user_tombstones)
+
+    asyncio.run(main.compact_users())
+    assert user_id not in main.users_db
+    assert len(main.user_tombstones) == 0
+    assert client.get("/metrics").json()["tombstones_reclaimed_total"] >= 1